@@ -7,7 +7,7 @@ from .models import Event, EventParticipant, EventAttachment
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'description', 'type', 'scheduled_date', 'stream_session_id', 'active')
+    list_display = ('id', 'title', 'description', 'type', 'scheduled_date', 'stream_session_id', 'active', 'participant_count')
 
 @admin.register(EventParticipant)
 class EventParticipantAdmin(admin.ModelAdmin):
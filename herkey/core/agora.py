@@ -4,6 +4,12 @@ import time
 from agora_token_builder import RtcTokenBuilder, RtmTokenBuilder
 from django.conf import settings
 
+from utils.cache import TTLCache
+
+from .metrics import timed
+
+token_cache = TTLCache(max_size=settings.AGORA_TOKEN_CACHE_SIZE, ttl=0)
+
 def create_agora_rtc_token_publisher(channel_name, uid=None, role='host', expire_time=86400):
     """
     Generate an Agora RTC token with the given channel name, UID, role, and expiration time.
@@ -28,9 +34,10 @@ def create_agora_rtc_token_publisher(channel_name, uid=None, role='host', expire
     privilege_expire_time = current_time + expire_time
 
     # Generate the token
-    token = RtcTokenBuilder.buildTokenWithUid(
-        APP_ID, APP_CERTIFICATE, channel_name, uid, role, privilege_expire_time
-    )
+    with timed("agora", "build_rtc_token"):
+        token = RtcTokenBuilder.buildTokenWithUid(
+            APP_ID, APP_CERTIFICATE, channel_name, uid, role, privilege_expire_time
+        )
 
     return {
         "token": token,
@@ -64,9 +71,10 @@ def create_agora_rtm_token_publisher(channel_name, uid=None, role='host', expire
     privilege_expire_time = current_time + expire_time
     account = str(uid)
     # Generate the token
-    token = RtmTokenBuilder.buildToken(
-        APP_ID, APP_CERTIFICATE, account, role, privilege_expire_time
-    )
+    with timed("agora", "build_rtm_token"):
+        token = RtmTokenBuilder.buildToken(
+            APP_ID, APP_CERTIFICATE, account, role, privilege_expire_time
+        )
 
     return {
         "token": token,
@@ -74,4 +82,95 @@ def create_agora_rtm_token_publisher(channel_name, uid=None, role='host', expire
         "uid": uid,
         "role": role,
         "privilege_expire_time": privilege_expire_time,
-    }
\ No newline at end of file
+    }
+
+
+def get_agora_token(kind, channel_name, uid=None, role='host', expire_time=86400):
+    """
+    Return an RTC or RTM token (``kind`` is "rtc" or "rtm"), reusing a cached
+    one for the same channel, UID and role while more than
+    AGORA_TOKEN_MIN_REMAINING_FRACTION of its lifetime is left.
+    """
+    builders = {
+        "rtc": create_agora_rtc_token_publisher,
+        "rtm": create_agora_rtm_token_publisher,
+    }
+    reuse_for = expire_time * (1 - settings.AGORA_TOKEN_MIN_REMAINING_FRACTION)
+    return token_cache.get_or_set(
+        (channel_name, uid, role, kind),
+        lambda: builders[kind](channel_name, uid, role, expire_time),
+        ttl=reuse_for,
+    )
+
+
+def participant_role(participant_type):
+    """Map an EventParticipant type to the Agora role used for its tokens."""
+    return "host" if participant_type == "HOST" else "audience"
+
+
+def create_participant_tokens(channel_name, user_id, role, expire_time=86400):
+    """
+    Build the RTC, RTC screen-share and RTM tokens a participant needs to join
+    a channel, as returned by the agora-token endpoint.
+    """
+    return {
+        "role": role,
+        "rtc_token": create_agora_rtc_token_publisher(
+            channel_name, user_id, role, expire_time
+        ),
+        "rtc_screen_share_token": create_agora_rtc_token_publisher(
+            channel_name, user_id + 100, role, expire_time
+        ),
+        "rtm_token": create_agora_rtm_token_publisher(
+            channel_name, user_id, role, expire_time
+        ),
+    }
+
+
+def mint_participant_tokens(channel_name, participants, expire_time=86400):
+    """
+    Build tokens for ``(participant_id, user_id, role)`` tuples. Runs in worker
+    processes, so it only touches settings, never the database.
+    """
+    return [
+        (
+            participant_id,
+            create_participant_tokens(channel_name, user_id, role, expire_time),
+        )
+        for participant_id, user_id, role in participants
+    ]
+
+
+def participant_tokens_are_fresh(tokens, role, expire_time=86400):
+    """
+    Whether pre-minted ``tokens`` are for ``role`` and still have more than
+    AGORA_TOKEN_MIN_REMAINING_FRACTION of their lifetime left.
+    """
+    if not tokens or tokens.get("role") != role:
+        return False
+    remaining = tokens["rtc_token"]["privilege_expire_time"] - time.time()
+    return remaining > expire_time * settings.AGORA_TOKEN_MIN_REMAINING_FRACTION
+
+
+def participant_agora_tokens(participant, channel_name, user_id):
+    """
+    The tokens the agora-token endpoint returns to ``participant``: the
+    pre-minted ones while they are fresh, otherwise cached or newly built.
+    """
+    role = participant_role(participant.type)
+    tokens = participant.agora_tokens
+    # Stored tokens were minted for the event id as the channel name
+    same_channel = channel_name == str(participant.event_id)
+    if same_channel and participant_tokens_are_fresh(tokens, role):
+        return {
+            "rtc_token": tokens["rtc_token"],
+            "rtc_screen_share_token": tokens["rtc_screen_share_token"],
+            "rtm_token": tokens["rtm_token"],
+        }
+    return {
+        "rtc_token": get_agora_token("rtc", channel_name, user_id, role),
+        "rtc_screen_share_token": get_agora_token(
+            "rtc", channel_name, user_id + 100, role
+        ),
+        "rtm_token": get_agora_token("rtm", channel_name, user_id, role),
+    }
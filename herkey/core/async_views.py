@@ -0,0 +1,167 @@
+""" Async versions of the I/O-bound endpoints, for serving over ASGI. """
+
+import asyncio
+from functools import partial
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse
+from rest_framework import status
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import event_cache
+from .agora import participant_agora_tokens
+from .conditional import ConditionalGetViewSetMixin
+from .fieldsets import SparseFieldsetViewSetMixin
+from .models import EventParticipant
+from .s3 import generate_presigned_upload
+from .views import EVENT_RESOURCE, EventDocumentMixin, EventViewSet
+
+
+def run_in_executor(func, *args):
+    """
+    Run ``func`` in the event loop's default executor, for calls that may
+    block, such as boto3 fetching credentials while it signs."""
+    return asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
+
+
+class AsyncAPIView(APIView):
+    """
+    An ``APIView`` whose handlers are coroutines. Django serves it as an async
+    view, so under ASGI it runs on the event loop instead of in a thread.
+
+    Authentication, permission checks and content negotiation are the same as
+    DRF's. They run in a thread when there are authenticators, since those
+    may load the user.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            if request.authenticators:
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+            else:
+                self.initial(request, *args, **kwargs)
+            handler = getattr(
+                self, request.method.lower(), self.http_method_not_allowed
+            )
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class EventDetailView(
+    EventDocumentMixin,
+    ConditionalGetViewSetMixin,
+    SparseFieldsetViewSetMixin,
+    AsyncAPIView,
+):
+    """
+    ``/api/events/<pk>/`` with an async ``GET``, served like
+    ``EventViewSet.retrieve``. Other methods go to ``EventViewSet``.
+    """
+
+    permission_classes = [IsAuthenticated]
+    resource = EVENT_RESOURCE
+    resource_name = EVENT_RESOURCE.name
+    write_view = staticmethod(
+        EventViewSet.as_view({"put": "update", "delete": "destroy"})
+    )
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            return await sync_to_async(self.write_view)(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, pk):
+        """Retrieve a single event entry by ID."""
+        if not isinstance(pk, UUID):
+            pk = UUID(pk)
+        fields = self.get_fields()
+        validators = await self.aget_validators(
+            pk,
+            participants="participants" in fields,
+            attachments="attachments" in fields,
+        )
+        not_modified = self.not_modified_response(validators)
+        if not_modified is not None:
+            return not_modified
+        # Cache lookups and rebuilds are synchronous, see core.event_cache
+        content = await sync_to_async(event_cache.get_or_build)(
+            pk,
+            self.get_document_variant(fields, validators),
+            partial(self.render_document, pk, fields),
+        )
+        return self.document_response(content, validators)
+
+
+class PreSignedURLView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        """Get a pre-signed URL for an attachment."""
+        data = JSONParser().parse(request)
+        file_name = data.get("file_name")
+        if not file_name:
+            return Response(
+                {"error": "attachment_cloud_id is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            cloud_id, signed_url = await run_in_executor(
+                generate_presigned_upload, file_name
+            )
+            return Response({"signed_url": signed_url, "cloud_id": cloud_id})
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class AgoraTokenView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        """Create an Agora RTC token for a publisher."""
+        data = JSONParser().parse(request)
+        channel_name = data.get("event_id")
+        user_id = request.user.pk
+        try:
+            event_participant = await EventParticipant.objects.only(
+                "event_id", "type", "agora_tokens"
+            ).aget(event_id=channel_name, user_id=user_id)
+        except EventParticipant.DoesNotExist:
+            raise Http404
+        # Stored or cached tokens are a lookup and building them takes well
+        # under a millisecond of CPU, which a thread would not take off the
+        # event loop, so this runs inline
+        return Response(
+            participant_agora_tokens(event_participant, channel_name, user_id)
+        )
+
+
+class HealthCheckView(AsyncAPIView):
+    # Nothing to authenticate, so no thread is needed for the request
+    authentication_classes = ()
+    permission_classes = ()
+
+    async def get(self, request):
+        return JsonResponse({"status": "healthy"})
+
+
+get_pre_signed_url = PreSignedURLView.as_view()
+create_agora_token = AgoraTokenView.as_view()
+health_check = HealthCheckView.as_view()
+event_detail = EventDetailView.as_view()
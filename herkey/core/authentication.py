@@ -0,0 +1,44 @@
+""" Stateless JWT authentication backed by the claims in the token. """
+
+from django.utils.functional import cached_property
+from rest_framework_simplejwt import models
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+# User fields copied into every token by CustomTokenObtainPairSerializer
+USER_CLAIMS = ("username", "email", "first_name", "last_name", "is_staff")
+
+
+class TokenUser(models.TokenUser):
+    """
+    simplejwt's token-backed user, with the profile fields the API embeds
+    in its tokens."""
+
+    @cached_property
+    def email(self):
+        return self.token.get("email", "")
+
+    @cached_property
+    def first_name(self):
+        return self.token.get("first_name", "")
+
+    @cached_property
+    def last_name(self):
+        return self.token.get("last_name", "")
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds ``request.user`` from the verified
+    token's claims instead of loading the ``User`` row, so authenticating
+    runs no queries. Tokens issued before the claims were embedded fall back
+    to loading the user.
+
+    A deactivated or demoted user keeps the access their token grants until
+    it expires.
+    """
+
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+        return api_settings.TOKEN_USER_CLASS(validated_token)
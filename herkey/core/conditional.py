@@ -0,0 +1,96 @@
+""" Conditional GET (ETag / Last-Modified) for event resources. """
+
+import time
+
+from django.conf import settings
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import md5
+from django.utils.http import http_date, quote_etag
+
+from .models import Event
+from .s3 import SIGNED_URL_REFRESH_FRACTION
+
+
+def signed_url_window_start(now=None):
+    """
+    Start of the current signed URL window, as a Unix timestamp.
+
+    A cached signed URL is at most one window old when it is handed out and
+    lives for two, so a representation served during a window keeps working
+    signed URLs until the window ends. Representations carrying signed URLs
+    are therefore treated as modified at the start of every window.
+    """
+    window = int(settings.S3_SIGNED_URL_EXPIRES * SIGNED_URL_REFRESH_FRACTION)
+    now = int(time.time() if now is None else now)
+    return now - now % window
+
+
+class ConditionalGetViewSetMixin:
+    """
+    Answers ``If-None-Match`` / ``If-Modified-Since`` on event resources
+    from one aggregate query over the ``modified`` timestamps of the event
+    and its children, before anything is serialized.
+    """
+
+    def get_validators(self, pk, participants=True, attachments=True):
+        """
+        Return ``(etag, last_modified)`` for event ``pk``, where
+        ``last_modified`` is a Unix timestamp. Counter updates move the
+        event's ``modified``, so deleting a child changes both validators,
+        and the counters are part of the ETag as well."""
+        row = self.validators_queryset(pk, participants, attachments).first()
+        return self.make_validators(row, attachments)
+
+    async def aget_validators(self, pk, participants=True, attachments=True):
+        """Async version of ``get_validators()``."""
+        row = await self.validators_queryset(pk, participants, attachments).afirst()
+        return self.make_validators(row, attachments)
+
+    def validators_queryset(self, pk, participants, attachments):
+        return (
+            Event.objects.filter(pk=pk)
+            .with_last_modified(participants=participants, attachments=attachments)
+            .values(
+                "last_modified", "participant_count", "host_count", "attachment_count"
+            )
+        )
+
+    def make_validators(self, row, attachments):
+        if row is None:
+            raise Http404
+        last_modified = int(row["last_modified"].timestamp())
+        parts = [
+            row["last_modified"].isoformat(),
+            row["participant_count"],
+            row["host_count"],
+            row["attachment_count"],
+        ]
+        if attachments:
+            window_start = signed_url_window_start()
+            last_modified = max(last_modified, window_start)
+            parts.append(window_start)
+        etag = md5(
+            ":".join(str(part) for part in parts).encode(), usedforsecurity=False
+        ).hexdigest()
+        return quote_etag(etag), last_modified
+
+    def not_modified_response(self, validators):
+        """Return a 304 response if the client's copy is current, else None."""
+        etag, last_modified = validators
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            self.set_validators(response, validators)
+        return response
+
+    def set_validators(self, response, validators):
+        """
+        Attach ``ETag`` and ``Last-Modified`` to ``response`` and require
+        clients to revalidate rather than guess a freshness lifetime."""
+        etag, last_modified = validators
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
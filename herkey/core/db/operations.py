@@ -0,0 +1,30 @@
+""" Migration operations that adapt to the database vendor. """
+
+from django.contrib.postgres import operations as postgres_operations
+from django.contrib.postgres.indexes import PostgresIndex
+from django.db.migrations import AddIndex
+
+
+class AddIndexConcurrently(postgres_operations.AddIndexConcurrently):
+    """
+    Build the index with CREATE INDEX CONCURRENTLY on PostgreSQL, which does
+    not block writes to the table while it runs, and with a plain CREATE
+    INDEX elsewhere. PostgreSQL-only index types, such as GIN, are skipped
+    on other databases. Migrations using it must set ``atomic = False``.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        elif not isinstance(self.index, PostgresIndex):
+            AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        elif not isinstance(self.index, PostgresIndex):
+            AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
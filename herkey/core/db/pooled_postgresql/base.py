@@ -0,0 +1,138 @@
+"""
+PostgreSQL with an in-process connection pool.
+
+Django opens a connection when a request first queries and closes it when
+the request ends, or after CONN_MAX_AGE seconds. With this backend opening
+takes a connection from a pool of the process and closing gives it back, so
+the cost of connecting is paid once per pooled connection, and a spike waits
+for a free connection instead of exhausting the server's max_connections.
+
+Pool sizes come from the database's ``POOL`` setting: ``MIN_SIZE``,
+``MAX_SIZE`` and ``TIMEOUT``, the seconds to wait for a free connection
+before raising ``OperationalError``. Leave CONN_MAX_AGE at 0, so requests
+hold a connection only while they run.
+"""
+
+import os
+import threading
+from functools import partial
+
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from utils.pool import ConnectionPool, PoolTimeout
+
+DEFAULT_POOL = {"MIN_SIZE": 0, "MAX_SIZE": 10, "TIMEOUT": 10.0}
+
+# Pools of this process, by database alias and connection parameters
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = None
+
+
+def get_pools():
+    """Return the pools of this process, as ``{(alias, params): pool}``."""
+    global _pools_pid
+    if _pools_pid != os.getpid():
+        # Forked: the parent's connections are not ours to use
+        _pools.clear()
+        _pools_pid = os.getpid()
+    return _pools
+
+
+def close_pools():
+    """Close every pool of this process, for example before forking."""
+    with _pools_lock:
+        pools = get_pools()
+        closing = list(pools.values())
+        pools.clear()
+    for pool in closing:
+        pool.close()
+
+
+def pool_stats():
+    """Stats of this process's pools, by database alias."""
+    with _pools_lock:
+        pools = list(get_pools().items())
+    return {alias: pool.stats() for (alias, _), pool in pools}
+
+
+def reset_connection(connection):
+    """Roll back whatever the connection was doing before it is reused."""
+    if connection.closed:
+        return False
+    if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+def ping_connection(connection):
+    if connection.closed:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Pooled connections to the test database would keep it from being
+        # dropped
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        key = (self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            pools = get_pools()
+            pool = pools.get(key)
+            if pool is None or pool.closed:
+                options = {**DEFAULT_POOL, **self.settings_dict.get("POOL", {})}
+                # Pooled connections are set up like plain Django ones, by a
+                # wrapper of their own since the pool outlives this one
+                connector = base.DatabaseWrapper(self.settings_dict, self.alias)
+                pool = pools[key] = ConnectionPool(
+                    connect=partial(connector.get_new_connection, conn_params),
+                    close=lambda connection: connection.close(),
+                    min_size=options["MIN_SIZE"],
+                    max_size=options["MAX_SIZE"],
+                    timeout=options["TIMEOUT"],
+                    # Connections wait in the pool, so they are checked on
+                    # the way out the way CONN_HEALTH_CHECKS checks
+                    # persistent ones
+                    check=(
+                        ping_connection
+                        if self.settings_dict["CONN_HEALTH_CHECKS"]
+                        else None
+                    ),
+                    reset=reset_connection,
+                )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        try:
+            connection = self.pool.acquire()
+        except PoolTimeout as e:
+            raise base.Database.OperationalError(str(e)) from e
+        self.isolation_level = self.settings_dict["OPTIONS"].get(
+            "isolation_level", connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps using a connection closed inside atomic(), so
+                # it must not go back to the pool
+                self.pool.discard(self.connection)
+            else:
+                self.pool.release(self.connection)
@@ -0,0 +1,154 @@
+""" A read-through cache of rendered event documents. """
+
+import threading
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.crypto import md5
+
+from .routers import reading_from_replicas
+
+# How often a request waiting on another's rebuild looks for the result
+WAIT_INTERVAL = 0.01
+
+
+class EventCacheStats:
+    """Per-process hit and rebuild counters of the event cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.waits = 0
+            self.rebuilds = 0
+            self.rebuild_seconds = 0.0
+            self.max_rebuild_seconds = 0.0
+
+    def record(self, hit=False, waited=False):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if waited:
+                self.waits += 1
+
+    def record_rebuild(self, seconds):
+        with self._lock:
+            self.rebuilds += 1
+            self.rebuild_seconds += seconds
+            self.max_rebuild_seconds = max(self.max_rebuild_seconds, seconds)
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "waits": self.waits,
+                "rebuilds": self.rebuilds,
+                "rebuild_seconds_total": self.rebuild_seconds,
+                "rebuild_seconds_mean": (
+                    self.rebuild_seconds / self.rebuilds if self.rebuilds else 0.0
+                ),
+                "rebuild_seconds_max": self.max_rebuild_seconds,
+            }
+
+
+stats = EventCacheStats()
+
+
+def get_cache():
+    return caches["events"]
+
+
+def _version_key(event_id):
+    return f"event:{event_id}:version"
+
+
+def _document_key(cache, event_id, variant):
+    """
+    The key of one rendered variant of an event. Keys embed the event's
+    current version, so invalidating the version drops every variant."""
+    version = cache.get_or_set(_version_key(event_id), lambda: uuid4().hex, None)
+    digest = md5(repr(variant).encode(), usedforsecurity=False).hexdigest()
+    return f"event:{event_id}:{version}:{digest}"
+
+
+def get_or_build(event_id, variant, build):
+    """
+    Return the cached document for ``(event_id, variant)``, calling ``build``
+    on a miss.
+
+    Rebuilds are single-flight: the first request to miss takes a lock in the
+    cache and the others wait for its result, for up to
+    EVENT_CACHE_LOCK_TIMEOUT seconds, instead of all rebuilding at once.
+
+    Requests reading from replicas use cached documents but do not store
+    theirs, since a lagging replica would fill the cache with rows older
+    than the invalidation that emptied it.
+    """
+    cache = get_cache()
+    key = _document_key(cache, event_id, variant)
+    document = cache.get(key)
+    if document is not None:
+        stats.record(hit=True)
+        return document
+    if reading_from_replicas():
+        stats.record()
+        return _rebuild(cache, key, build, store=False)
+
+    lock_key = f"{key}:lock"
+    lock_timeout = settings.EVENT_CACHE_LOCK_TIMEOUT
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key, True, lock_timeout):
+        if time.monotonic() >= deadline:
+            # The rebuilding request is stuck or gone; do not wait on it
+            stats.record(waited=True)
+            return _rebuild(cache, key, build)
+        time.sleep(WAIT_INTERVAL)
+        document = cache.get(key)
+        if document is not None:
+            stats.record(hit=True, waited=True)
+            return document
+    try:
+        # Another request may have finished rebuilding before we took the lock
+        document = cache.get(key)
+        if document is not None:
+            stats.record(hit=True)
+            return document
+        stats.record()
+        return _rebuild(cache, key, build)
+    finally:
+        cache.delete(lock_key)
+
+
+def _rebuild(cache, key, build, store=True):
+    started = time.perf_counter()
+    document = build()
+    stats.record_rebuild(time.perf_counter() - started)
+    if store:
+        cache.set(key, document)
+    return document
+
+
+def invalidate_event(event_id):
+    """
+    Drop every cached document of an event.
+
+    This happens at once and again when the current transaction commits,
+    since a request may rebuild from the pre-commit rows in between."""
+
+    def invalidate():
+        get_cache().delete(_version_key(event_id))
+
+    invalidate()
+    transaction.on_commit(invalidate)
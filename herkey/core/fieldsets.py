@@ -0,0 +1,185 @@
+""" JSON:API sparse fieldsets, a fast path for flat representations and streaming. """
+
+import datetime
+from uuid import UUID
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+
+from .renderers import FastJSONEncodingRenderer
+
+
+def to_json_value(value):
+    """Format a ``.values()`` cell the way the DRF model fields would."""
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    if isinstance(value, (datetime.date, UUID)):
+        return str(value)
+    return value
+
+
+class Resource:
+    """
+    How a JSON:API resource type maps onto its serializer: which serializer
+    fields are nested serializers and which render as relationships.
+    """
+
+    def __init__(
+        self, name, serializer_class, nested_fields=(), relationship_types=None
+    ):
+        self.name = name
+        self.serializer_class = serializer_class
+        self.nested_fields = nested_fields
+        # Serializer fields rendered as relationships, with the related type
+        self.relationship_types = relationship_types or {}
+
+    def get_fields(self, request):
+        """
+        Return the serializer fields the request asked for through
+        ``fields[<name>]`` or ``?summary=true``, in serializer order."""
+        declared = self.serializer_class.Meta.fields
+        param = request.query_params.get(f"fields[{self.name}]")
+        if param is not None:
+            wanted = {name.strip() for name in param.split(",") if name.strip()}
+            unknown = wanted.difference(declared)
+            if unknown:
+                raise ParseError(
+                    f"Unknown fields for {self.name}: {', '.join(sorted(unknown))}"
+                )
+            return tuple(name for name in declared if name in wanted or name == "id")
+        if request.query_params.get("summary") in ("1", "true"):
+            return tuple(name for name in declared if name not in self.nested_fields)
+        return declared
+
+    def has_nested(self, fields):
+        return any(name in self.nested_fields for name in fields)
+
+    def get_columns(self, fields, ordering=("-created", "-id")):
+        """
+        Model columns needed to render ``fields`` and to paginate on
+        ``ordering``."""
+        columns = [name for name in fields if name not in self.nested_fields]
+        columns += [name.lstrip("-") for name in ordering]
+        return list(dict.fromkeys(columns + ["id"]))
+
+    def to_resource(self, row, fields):
+        """
+        Build a JSON:API resource object from a ``.values()`` row or from
+        serializer data."""
+        attributes = {}
+        relationships = {}
+        for name in fields:
+            if name == "id":
+                continue
+            if name in self.relationship_types:
+                relationships[name] = {
+                    "data": {
+                        "type": self.relationship_types[name],
+                        "id": to_json_value(row[name]),
+                    }
+                }
+            else:
+                attributes[name] = to_json_value(row[name])
+        resource = {
+            "type": self.name,
+            "id": to_json_value(row["id"]),
+            "attributes": attributes,
+        }
+        if relationships:
+            resource["relationships"] = relationships
+        return resource
+
+
+def stream_json_api_document(resources, batch_size):
+    """
+    Yield a ``{"data": [...]}`` document one batch of encoded resources at a
+    time, so only ``batch_size`` resources are held in memory."""
+    encoder = FastJSONEncodingRenderer()
+    separator = b""
+    batch = []
+    yield b'{"data":['
+    for resource in resources:
+        batch.append(encoder.render(resource))
+        if len(batch) == batch_size:
+            yield separator + b",".join(batch)
+            separator = b","
+            batch = []
+    if batch:
+        yield separator + b",".join(batch)
+    yield b"]}"
+
+
+class SparseFieldsetViewSetMixin:
+    """
+    Honors ``fields[<resource_name>]`` and ``?summary=true`` on plain
+    ``ViewSet`` classes. Representations without nested fields are built
+    straight from ``.values()`` rows, skipping DRF field objects.
+    """
+
+    resource = None
+
+    def get_fields(self, resource=None):
+        return (resource or self.resource).get_fields(self.request)
+
+    def paginated_values_response(self, queryset, fields, resource=None):
+        """
+        Paginate ``queryset.values()`` and return a ready-made JSON:API
+        document, which the renderer passes through untouched."""
+        resource = resource or self.resource
+        paginator = self.pagination_class()
+        columns = resource.get_columns(
+            fields, paginator.get_ordering(self.request, queryset, self)
+        )
+        rows = paginator.paginate_queryset(
+            queryset.values(*columns), self.request, view=self
+        )
+        response = paginator.get_paginated_response(
+            [resource.to_resource(row, fields) for row in rows]
+        )
+        response.data = {
+            "links": response.data["links"],
+            "data": response.data["results"],
+            "meta": response.data["meta"],
+        }
+        # Tell the JSON:API renderer the document is already built
+        self.resource_name = False
+        return response
+
+    def values_response(self, queryset, fields, resource=None):
+        """
+        Return every row of ``queryset.values()`` as a ready-made JSON:API
+        document, for short unpaginated lists."""
+        resource = resource or self.resource
+        rows = queryset.values(*resource.get_columns(fields))
+        self.resource_name = False
+        return Response({"data": [resource.to_resource(row, fields) for row in rows]})
+
+    def wants_stream(self):
+        return self.request.query_params.get("stream") in ("1", "true")
+
+    def streaming_response(self, queryset, fields, resource=None):
+        """
+        Stream every row of ``queryset`` as a JSON:API document, reading it
+        through a server-side cursor in chunks of STREAM_CHUNK_SIZE."""
+        resource = resource or self.resource
+        chunk_size = settings.STREAM_CHUNK_SIZE
+        queryset = queryset.order_by("-created", "-id")
+        if resource.has_nested(fields):
+            rows = (
+                resource.serializer_class(instance, fields=fields).data
+                for instance in queryset.iterator(chunk_size=chunk_size)
+            )
+        else:
+            rows = queryset.values(*resource.get_columns(fields)).iterator(
+                chunk_size=chunk_size
+            )
+        return StreamingHttpResponse(
+            stream_json_api_document(
+                (resource.to_resource(row, fields) for row in rows), chunk_size
+            ),
+            content_type="application/vnd.api+json",
+        )
@@ -0,0 +1,93 @@
+""" Filter backends for the core app. """
+
+import re
+
+from django.db.models import F
+from rest_framework import filters
+from rest_framework.settings import api_settings
+from rest_framework_json_api import filters as json_api_filters
+
+
+class QueryParameterValidationFilter(json_api_filters.QueryParameterValidationFilter):
+    """
+    JSON:API query parameter validation that also accepts this API's
+    ``summary`` and ``stream`` flags."""
+
+    query_regex = re.compile(
+        r"^(sort|include|summary|stream)$"
+        r"|^(?P<type>filter|fields|page)(\[[\w\.\-]+\])?$"
+    )
+
+
+def nullable_fields(model, ordering):
+    """The fields in ``ordering`` that may hold NULL."""
+    names = (field.lstrip("-") for field in ordering)
+    return {name for name in names if name != "pk" and model._meta.get_field(name).null}
+
+
+def order_by_nulls_last(ordering, nullable, nulls_last=True):
+    """
+    ``ordering`` as ``order_by()`` arguments that sort the NULLs of the
+    ``nullable`` fields last in either direction, or first."""
+    nulls = {"nulls_last": True} if nulls_last else {"nulls_first": True}
+    expressions = []
+    for field in ordering:
+        name = field.lstrip("-")
+        if name not in nullable:
+            expressions.append(field)
+        elif field.startswith("-"):
+            expressions.append(F(name).desc(**nulls))
+        else:
+            expressions.append(F(name).asc(**nulls))
+    return expressions
+
+
+class OrderingFilter(json_api_filters.OrderingFilter):
+    """
+    JSON:API ``sort`` with the primary key appended as a tie-breaker, so
+    keyset pages are stable. Rows with NULL in a sorted column come last."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or ())
+        if ordering and not any(
+            field.lstrip("-") in ("id", "pk") for field in ordering
+        ):
+            ordering.append("-id" if ordering[0].startswith("-") else "id")
+        return ordering
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        return queryset.order_by(
+            *order_by_nulls_last(ordering, nullable_fields(queryset.model, ordering))
+        )
+
+
+class SearchFilter(filters.SearchFilter):
+    """
+    ``filter[search]`` as full-text search on querysets that provide
+    ``search()``, such as events; DRF's ``icontains`` over ``search_fields``
+    for the rest."""
+
+    def filter_queryset(self, request, queryset, view):
+        if not hasattr(queryset, "search"):
+            return super().filter_queryset(request, queryset, view)
+        text = request.query_params.get(self.search_param, "")
+        if not text.strip():
+            return queryset
+        return queryset.search(text)
+
+
+class FilteredViewSetMixin:
+    """
+    Filtering for plain ``ViewSet`` classes, which do not get
+    ``filter_queryset`` from ``GenericAPIView``."""
+
+    filter_backends = api_settings.DEFAULT_FILTER_BACKENDS
+
+    def filter_queryset(self, queryset):
+        """Run ``queryset`` through each of the view's filter backends."""
+        for backend in list(self.filter_backends):
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
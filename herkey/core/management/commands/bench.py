@@ -0,0 +1,357 @@
+""" Seed synthetic data and benchmark every API endpoint end to end. """
+
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from uuid import uuid4
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.management.commands.bench_search import vocabulary
+from core.models import Event, EventAttachment, EventParticipant
+
+PASSWORD = "bench-password"
+
+
+def percentile(ordered, fraction):
+    """The nearest-rank percentile of the sorted ``ordered`` values."""
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class QueryCounter:
+    """An execute_wrapper counting the queries run on any connection."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Dataset:
+    """Rows seeded for one run, and JWTs for the users the requests use."""
+
+    def __init__(self, users, events, participants, words):
+        self.users = users
+        self.events = events
+        self.participants = participants
+        self.words = words
+        self._tokens = {}
+
+    def token(self, user_id):
+        if user_id not in self._tokens:
+            user = next(user for user in self.users if user.pk == user_id)
+            self._tokens[user_id] = str(AccessToken.for_user(user))
+        return self._tokens[user_id]
+
+
+def seed(users, events, participants, attachments, rng):
+    """
+    Bulk insert the synthetic rows. Counters are set directly, since bulk
+    inserts skip the signals that keep them up to date."""
+    words = vocabulary(500)
+    prefix = uuid4().hex[:8]
+    # Hashing is deliberately slow, so every user shares one hash
+    password = make_password(PASSWORD)
+    user_rows = User.objects.bulk_create(
+        [
+            User(
+                username=f"bench-{prefix}-{index}",
+                email=f"bench-{prefix}-{index}@example.com",
+                first_name=rng.choice(words).title(),
+                last_name=rng.choice(words).title(),
+                password=password,
+            )
+            for index in range(users)
+        ],
+        batch_size=1000,
+    )
+    if not connections["default"].features.can_return_rows_from_bulk_insert:
+        # The inserted users came back without their ids
+        user_rows = list(User.objects.filter(username__startswith=f"bench-{prefix}-"))
+    per_event = min(participants, len(user_rows))
+    event_rows = Event.objects.bulk_create(
+        [
+            Event(
+                title=" ".join(rng.choices(words, k=rng.randint(3, 6))),
+                description=" ".join(rng.choices(words, k=rng.randint(12, 20))),
+                participant_count=per_event,
+                host_count=int(per_event > 0),
+                attachment_count=attachments,
+            )
+            for _ in range(events)
+        ],
+        batch_size=1000,
+    )
+    participant_rows = []
+    for event in event_rows:
+        for position, user in enumerate(rng.sample(user_rows, per_event)):
+            participant_rows.append(
+                EventParticipant(
+                    event=event,
+                    user=user,
+                    type="HOST" if position == 0 else "PARTICIPANT",
+                )
+            )
+    EventParticipant.objects.bulk_create(participant_rows, batch_size=5000)
+    EventAttachment.objects.bulk_create(
+        [
+            EventAttachment(
+                event=event,
+                attachment_cloud_id=f"event_attachments/bench_{uuid4()}",
+                attachment_name=f"image-{position}.png",
+                type="BANNER" if position == 0 else "EVENT_IMAGE",
+            )
+            for event in event_rows
+            for position in range(attachments)
+        ],
+        batch_size=5000,
+    )
+    return Dataset(
+        user_rows,
+        event_rows,
+        [(row.event_id, row.user_id) for row in participant_rows],
+        words,
+    )
+
+
+def endpoints(data, rng):
+    """
+    Each endpoint as ``name: request()``, where ``request`` picks its
+    arguments and returns ``(user_id or None, method, path, json_body)``."""
+
+    def any_user():
+        return rng.choice(data.users).pk
+
+    def any_event():
+        return rng.choice(data.events).pk
+
+    def agora_token():
+        event_id, user_id = rng.choice(data.participants)
+        return user_id, "POST", "/api/agora-token/", {"event_id": str(event_id)}
+
+    def token_obtain():
+        body = {"username": rng.choice(data.users).username, "password": PASSWORD}
+        return None, "POST", "/api/token/", body
+
+    return {
+        "event_list": lambda: (any_user(), "GET", "/api/events/", None),
+        "event_retrieve": lambda: (
+            any_user(),
+            "GET",
+            f"/api/events/{any_event()}/",
+            None,
+        ),
+        "event_search": lambda: (
+            any_user(),
+            "GET",
+            f"/api/events/search/?filter[search]={rng.choice(data.words[:50])}",
+            None,
+        ),
+        "event_participants": lambda: (
+            any_user(),
+            "GET",
+            f"/api/events/{any_event()}/get_participants/",
+            None,
+        ),
+        "participant_list": lambda: (
+            any_user(),
+            "GET",
+            "/api/event-participants/",
+            None,
+        ),
+        "user_list": lambda: (any_user(), "GET", "/api/users/", None),
+        "agora_token": agora_token,
+        "presigned_url": lambda: (
+            any_user(),
+            "POST",
+            "/api/event-attachments/get_pre_signed_url/",
+            {"file_name": f"upload-{rng.randrange(10**6)}.png"},
+        ),
+        "token_obtain": token_obtain,
+    }
+
+
+def run_endpoint(client, data, request, count, warmup, counter):
+    """Send ``warmup`` then ``count`` requests and summarize the latter."""
+    timings = []
+    queries = []
+    statuses = {}
+    for index in range(warmup + count):
+        user_id, method, path, body = request()
+        headers = {}
+        if user_id is not None:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {data.token(user_id)}"
+        counter.count = 0
+        start = time.perf_counter()
+        if method == "GET":
+            response = client.get(path, **headers)
+        else:
+            response = client.generic(
+                method,
+                path,
+                json.dumps(body),
+                content_type="application/json",
+                **headers,
+            )
+        if response.streaming:
+            # Streamed responses are produced while they are read
+            b"".join(response.streaming_content)
+        elapsed = time.perf_counter() - start
+        if index < warmup:
+            continue
+        timings.append(elapsed)
+        queries.append(counter.count)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    timings.sort()
+    return {
+        "requests": count,
+        "errors": sum(n for code, n in statuses.items() if code >= 400),
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+        "throughput_rps": round(count / sum(timings), 1),
+        "latency_ms": {
+            name: round(value * 1000, 3)
+            for name, value in (
+                ("mean", statistics.fmean(timings)),
+                ("p50", percentile(timings, 0.50)),
+                ("p95", percentile(timings, 0.95)),
+                ("p99", percentile(timings, 0.99)),
+                ("max", timings[-1]),
+            )
+        },
+        "queries": {
+            "mean": round(statistics.fmean(queries), 2),
+            "max": max(queries),
+            "total": sum(queries),
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-seed synthetic users, events, participants and attachments, "
+        "then send requests to every API endpoint through the Django test "
+        "client. Reports per-endpoint p50/p95/p99 latency, throughput and "
+        "queries per request as JSON, for diffing runs across commits. The "
+        "seeded rows are rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--events", type=int, default=200)
+        parser.add_argument(
+            "--participants", type=int, default=50, help="Per event."
+        )
+        parser.add_argument(
+            "--attachments", type=int, default=3, help="Per event."
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Per endpoint."
+        )
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            help="Only benchmark this endpoint; may be repeated.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the report here.")
+        parser.add_argument(
+            "--keep", action="store_true", help="Commit the seeded rows."
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["users"] < 1 or options["events"] < 1:
+            raise CommandError("--requests, --users and --events must be positive")
+        rng = random.Random(options["seed"])
+        started = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        counter = QueryCounter()
+        with transaction.atomic(), ExitStack() as stack:
+            start = time.perf_counter()
+            data = seed(
+                options["users"],
+                options["events"],
+                options["participants"],
+                options["attachments"],
+                rng,
+            )
+            seed_seconds = time.perf_counter() - start
+            requests = endpoints(data, rng)
+            unknown = set(options["endpoints"] or ()) - set(requests)
+            if unknown:
+                raise CommandError(
+                    f"Unknown endpoints {sorted(unknown)}, "
+                    f"choose from {sorted(requests)}"
+                )
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            stack.enter_context(
+                override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"])
+            )
+            client = Client()
+            results = {
+                name: run_endpoint(
+                    client,
+                    data,
+                    request,
+                    options["requests"],
+                    options["warmup"],
+                    counter,
+                )
+                for name, request in requests.items()
+                if not options["endpoints"] or name in options["endpoints"]
+            }
+            if not options["keep"]:
+                transaction.set_rollback(True)
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "started": started,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connections["default"].vendor,
+                "debug": settings.DEBUG,
+                "seed_seconds": round(seed_seconds, 3),
+                "dataset": {
+                    name: options[name]
+                    for name in ("users", "events", "participants", "attachments")
+                },
+                "requests_per_endpoint": options["requests"],
+                "warmup": options["warmup"],
+            },
+            "endpoints": results,
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
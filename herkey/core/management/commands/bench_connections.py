@@ -0,0 +1,124 @@
+""" Benchmark per-request connections against persistent and pooled ones. """
+
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+
+from core.db.pooled_postgresql.base import close_pools, pool_stats
+
+# The query each simulated request runs, a primary key lookup on events
+QUERY = "SELECT id, title FROM core_event WHERE id = %s"
+MISSING_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def run_requests(settings_dict, requests, threads, queries):
+    """
+    Run ``requests`` simulated requests from ``threads`` threads, each with
+    its own connection wrapper. A request opens its connection on first use,
+    runs ``queries`` queries and ends the way Django ends one, by closing the
+    connection unless CONN_MAX_AGE keeps it. Returns per-request seconds.
+    """
+    backend = load_backend(settings_dict["ENGINE"])
+    local = threading.local()
+    wrappers = []
+    wrappers_lock = threading.Lock()
+
+    def request(_):
+        wrapper = getattr(local, "wrapper", None)
+        if wrapper is None:
+            wrapper = local.wrapper = backend.DatabaseWrapper(
+                dict(settings_dict), DEFAULT_DB_ALIAS
+            )
+            # Closed from the main thread once the run is over
+            wrapper.inc_thread_sharing()
+            with wrappers_lock:
+                wrappers.append(wrapper)
+        start = time.perf_counter()
+        # Django runs close_if_unusable_or_obsolete when requests start and end
+        wrapper.close_if_unusable_or_obsolete()
+        with wrapper.cursor() as cursor:
+            for _ in range(queries):
+                cursor.execute(QUERY, [MISSING_ID])
+                cursor.fetchall()
+        wrapper.close_if_unusable_or_obsolete()
+        return time.perf_counter() - start
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return list(executor.map(request, range(requests)))
+    finally:
+        for wrapper in wrappers:
+            wrapper.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run simulated requests against the default Postgres database from "
+        "many threads, opening a connection per request, keeping persistent "
+        "connections (CONN_MAX_AGE) and taking them from the pooled backend, "
+        "and report requests/s, latency and pool waits for each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=5000)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--queries", type=int, default=3)
+        parser.add_argument(
+            "--pool-size",
+            type=int,
+            default=None,
+            help="Pool MAX_SIZE; defaults to the configured one.",
+        )
+
+    def handle(self, *args, **options):
+        settings_dict = connections[DEFAULT_DB_ALIAS].settings_dict
+        if connections[DEFAULT_DB_ALIAS].vendor != "postgresql":
+            raise CommandError("bench_connections requires PostgreSQL")
+        pool = dict(settings_dict.get("POOL", {}))
+        if options["pool_size"]:
+            pool["MAX_SIZE"] = options["pool_size"]
+        plain = {**settings_dict, "ENGINE": "django.db.backends.postgresql"}
+        setups = (
+            ("connect per request", {**plain, "CONN_MAX_AGE": 0}),
+            ("persistent", {**plain, "CONN_MAX_AGE": None}),
+            (
+                "pooled",
+                {
+                    **settings_dict,
+                    "ENGINE": "core.db.pooled_postgresql",
+                    "CONN_MAX_AGE": 0,
+                    "POOL": pool,
+                },
+            ),
+        )
+        self.stdout.write(
+            f"{options['requests']} requests of {options['queries']} queries "
+            f"from {options['threads']} threads"
+        )
+        close_pools()
+        for name, setup in setups:
+            start = time.perf_counter()
+            timings = run_requests(
+                setup, options["requests"], options["threads"], options["queries"]
+            )
+            seconds = time.perf_counter() - start
+            timings.sort()
+            self.stdout.write(
+                f"  {name:<20} {len(timings) / seconds:8.0f} req/s  "
+                f"p50 {statistics.median(timings) * 1000:6.2f} ms  "
+                f"p99 {timings[int(len(timings) * 0.99) - 1] * 1000:6.2f} ms"
+            )
+        for stats in pool_stats().values():
+            self.stdout.write(
+                f"  pool: {stats['connections_opened']} connections opened, "
+                f"{stats['waits']} of {stats['acquisitions']} acquisitions "
+                f"waited (at most {stats['max_waiting']} at once, "
+                f"{stats['wait_seconds_max'] * 1000:.1f} ms), "
+                f"{stats['timeouts']} timed out"
+            )
+        close_pools()
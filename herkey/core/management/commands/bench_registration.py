@@ -0,0 +1,109 @@
+""" Concurrent participant registration load test. """
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection
+
+from core.models import Event, EventParticipant
+
+
+def register_with_check(event_id, user):
+    """The previous flow: re-fetch user and event, check, then insert."""
+    user = User.objects.get(username=user.username)
+    event = Event.objects.get(id=event_id)
+    if EventParticipant.objects.filter(user=user, event=event).exists():
+        return False
+    EventParticipant.objects.create(user=user, event=event)
+    return True
+
+
+def register_on_conflict(event_id, user):
+    """The single INSERT ... ON CONFLICT DO NOTHING statement."""
+    return EventParticipant.objects.register(event_id=event_id, user=user) is not None
+
+
+def spread_over(event_ids):
+    """
+    Register each user for one of ``event_ids`` instead of the event given,
+    so concurrent registrations update different event rows' counters."""
+
+    def register(event_id, user):
+        return register_on_conflict(event_ids[user.pk % len(event_ids)], user)
+
+    return register
+
+
+def run_concurrently(register, event_id, users, threads, attempts_per_user=2):
+    """
+    Register every user ``attempts_per_user`` times from ``threads`` threads at
+    once and return counts of inserts, rejected duplicates and errors, plus
+    elapsed seconds.
+    """
+
+    def attempt(user):
+        try:
+            return "created" if register(event_id, user) else "rejected"
+        except IntegrityError:
+            return "errors"
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        outcomes = list(executor.map(attempt, users * attempts_per_user))
+    seconds = time.perf_counter() - start
+    return {
+        "created": outcomes.count("created"),
+        "rejected": outcomes.count("rejected"),
+        "errors": outcomes.count("errors"),
+        "seconds": seconds,
+        "attempts_per_second": len(outcomes) / seconds,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Register users for a scratch event from many threads with the old "
+        "check-then-insert flow and with the single-statement insert, and "
+        "report throughput and duplicate counts. The single-statement insert "
+        "is also run spread over --events events, which shows how much the "
+        "lock on the one event row's counters costs. Use against Postgres."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--events", type=int, default=32)
+
+    def handle(self, *args, **options):
+        if options["events"] < 1:
+            raise CommandError("--events must be positive")
+        prefix = f"bench-{uuid4().hex[:8]}"
+        users = User.objects.bulk_create(
+            [User(username=f"{prefix}-{index}") for index in range(options["users"])]
+        )
+        try:
+            spread = [
+                Event.objects.create(title=prefix) for _ in range(options["events"])
+            ]
+            for name, register in (
+                ("check-then-insert", register_with_check),
+                ("insert-on-conflict", register_on_conflict),
+                (f"spread-{len(spread)}-events", spread_over([e.id for e in spread])),
+            ):
+                event = Event.objects.create(title=prefix)
+                result = run_concurrently(register, event.id, users, options["threads"])
+                rows = EventParticipant.objects.filter(event__title=prefix).count()
+                self.stdout.write(
+                    f"{name:<20} {result['attempts_per_second']:>9.1f} attempts/s  "
+                    f"created={result['created']} rejected={result['rejected']} "
+                    f"errors={result['errors']} rows={rows}"
+                )
+                event.delete()
+        finally:
+            Event.objects.filter(title=prefix).delete()
+            User.objects.filter(username__startswith=prefix).delete()
@@ -0,0 +1,99 @@
+""" Benchmark the JSON:API renderer against the fast-encoding renderer. """
+
+import json
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_json_api.renderers import JSONRenderer as JsonApiRenderer
+
+from core.models import Event, EventAttachment, EventParticipant
+from core.renderers import JSONRenderer, orjson
+from core.serializers import EventSerializer
+
+
+def build_events(count, participants, attachments):
+    """
+    Build unsaved events whose participants and attachments sit in the
+    prefetch cache, so serializing them needs no database."""
+    now = timezone.now()
+    events = []
+    for index in range(count):
+        event = Event(id=uuid4(), title=f"Event {index}", created=now, modified=now)
+        event._prefetched_objects_cache = {
+            "participants": [
+                EventParticipant(
+                    id=uuid4(),
+                    event=event,
+                    user=User(
+                        id=index * participants + position,
+                        username=f"user-{index}-{position}",
+                        email=f"user-{index}-{position}@example.com",
+                    ),
+                    created=now,
+                    modified=now,
+                )
+                for position in range(participants)
+            ],
+            "attachments": [
+                EventAttachment(
+                    id=uuid4(),
+                    event=event,
+                    attachment_cloud_id=f"event_attachments/{index}_{position}",
+                    created=now,
+                    modified=now,
+                )
+                for position in range(attachments)
+            ],
+        }
+        events.append(event)
+    return events
+
+
+class Command(BaseCommand):
+    help = (
+        "Render a large serialized event list with the stock JSON:API "
+        "renderer and with core.renderers.JSONRenderer, offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=200)
+        parser.add_argument("--participants", type=int, default=50)
+        parser.add_argument("--attachments", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        events = build_events(
+            options["events"], options["participants"], options["attachments"]
+        )
+        data = EventSerializer(events, many=True).data
+        context = {"view": SimpleNamespace(resource_name="event")}
+
+        results = {}
+        for name, renderer in (
+            ("rest_framework_json_api", JsonApiRenderer()),
+            ("core.renderers", JSONRenderer()),
+        ):
+            timings = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                body = renderer.render(data, renderer_context=dict(context))
+                timings.append(time.perf_counter() - start)
+            results[name] = (min(timings), body)
+
+        baseline, baseline_body = results["rest_framework_json_api"]
+        fast, fast_body = results["core.renderers"]
+        self.stdout.write(
+            f"document: {options['events']} events x {options['participants']} "
+            f"participants, {len(baseline_body) / 1e6:.1f} MB"
+        )
+        self.stdout.write(f"encoder: {'orjson' if orjson else 'stdlib json'}")
+        self.stdout.write(f"rest_framework_json_api: {baseline * 1000:.1f} ms")
+        self.stdout.write(f"core.renderers:          {fast * 1000:.1f} ms")
+        self.stdout.write(f"speedup:                 {baseline / fast:.2f}x")
+        same_document = json.loads(baseline_body) == json.loads(fast_body)
+        self.stdout.write(f"identical documents:     {same_document}")
+        self.stdout.write(f"identical bytes:         {baseline_body == fast_body}")
@@ -0,0 +1,137 @@
+""" Benchmark full-text event search against icontains on synthetic events. """
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+
+from core.models import Event
+
+# Synthetic titles and descriptions are drawn from these topic words, which
+# are the most frequent, followed by a long tail of made-up words
+TOPIC_WORDS = (
+    "python django react career women leadership mentoring product design "
+    "data science cloud security startup finance marketing growth remote "
+    "networking interview resume negotiation coding workshop webinar panel "
+    "fireside chat community return work balance wellness parenting "
+    "analytics machine learning devops testing mobile frontend backend "
+    "architecture strategy sales hiring diversity inclusion summit bootcamp "
+    "hackathon meetup masterclass story journey founder investor pitch "
+    "branding writing speaking coaching agile scrum kubernetes serverless "
+    "blockchain payments healthcare education sustainability"
+).split()
+VOCABULARY_SIZE = 5000
+SYLLABLES = "ba ko ri mu te sa lo vi ne da fu gi ha ji ka me no pa ru si".split()
+
+
+def vocabulary(size):
+    """The topic words followed by ``size`` distinct made-up words."""
+    tail = [
+        first + second + third
+        for first in SYLLABLES
+        for second in SYLLABLES
+        for third in SYLLABLES
+    ]
+    random.Random(0).shuffle(tail)
+    return TOPIC_WORDS + tail[:size]
+
+
+SEED_EVENTS = """
+INSERT INTO core_event (
+    id, created, modified, title, description, type, active, status,
+    participant_count, host_count, attachment_count
+)
+SELECT
+    gen_random_uuid(),
+    now() - n * interval '1 minute',
+    now(),
+    (SELECT string_agg(word, ' ') FROM (
+        SELECT words[1 + floor(%(vocabulary)s * power(random(), 3))::int] AS word
+        FROM generate_series(1, 3 + n %% 4)) AS title_words),
+    (SELECT string_agg(word, ' ') FROM (
+        SELECT words[1 + floor(%(vocabulary)s * power(random(), 3))::int] AS word
+        FROM generate_series(1, 12 + n %% 9)) AS description_words),
+    'SCHEDULED', true, 1, 0, 0, 0
+FROM generate_series(1, %(events)s) AS n, (SELECT %(words)s::text[] AS words) AS v
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic events and time prefix full-text search on the "
+        "GIN-indexed search_vector against icontains on title/description. "
+        "Runs in a transaction that is rolled back unless --keep is given. "
+        "PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--limit", type=int, default=50)
+        parser.add_argument(
+            "--query",
+            action="append",
+            dest="queries",
+            help="Search text to time; may be repeated.",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Commit the seeded events."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("bench_search requires PostgreSQL full-text search")
+        words = vocabulary(VOCABULARY_SIZE)
+        # Frequent and rare words, a prefix of a mid-frequency word and a miss
+        queries = options["queries"] or [
+            "pyth",
+            "career wom",
+            words[500][:4],
+            words[-1],
+            "zzz",
+        ]
+        with transaction.atomic():
+            self.seed(options["events"], words)
+            for text in queries:
+                self.compare(text, options["limit"], options["repeat"])
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    def seed(self, events, words):
+        # Word i is picked with a probability falling off like i ** -2/3
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                SEED_EVENTS,
+                {"events": events, "words": words, "vocabulary": len(words)},
+            )
+            cursor.execute("ANALYZE core_event")
+        self.stdout.write(
+            f"seeded {events} events in {time.perf_counter() - start:.1f} s "
+            f"({Event.objects.count()} in table)"
+        )
+
+    def compare(self, text, limit, repeat):
+        ranked = Event.objects.search(text).order_by("-rank", "-created", "-id")
+        matches = models.Q()
+        for word in text.split():
+            matches &= models.Q(title__icontains=word) | models.Q(
+                description__icontains=word
+            )
+        naive = Event.objects.filter(matches).order_by("-created", "-id")
+
+        self.stdout.write(f"\nquery {text!r}: {ranked.count()} matches")
+        for name, queryset in (("full-text", ranked), ("icontains", naive)):
+            page = queryset.values_list("id", flat=True)[:limit]
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(page.all())
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"  {name:<10} top {limit}: "
+                f"p50 {statistics.median(timings) * 1000:8.1f} ms, "
+                f"max {max(timings) * 1000:8.1f} ms"
+            )
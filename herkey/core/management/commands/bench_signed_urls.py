@@ -0,0 +1,74 @@
+""" Benchmark serializing attachments with and without the shared S3 client. """
+
+import time
+from uuid import uuid4
+
+import boto3
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Event, EventAttachment
+from core.s3 import signed_url_cache
+from core.serializers import EventAttachmentSerializer
+
+
+def sign_with_new_client(attachment):
+    """The previous behaviour: build a fresh client for every attachment."""
+    s3_client = boto3.client(
+        "s3",
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_REGION,
+    )
+    return s3_client.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": settings.AWS_STORAGE_BUCKET_NAME,
+            "Key": attachment.attachment_cloud_id,
+        },
+        ExpiresIn=settings.S3_SIGNED_URL_EXPIRES,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare signing attachments with a new S3 client each against the "
+        "shared client and URL cache. Signing is local, so this runs offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        event = Event(id=uuid4(), title="bench")
+        attachments = [
+            EventAttachment(
+                id=uuid4(),
+                event=event,
+                attachment_cloud_id=f"event_attachments/bench_{uuid4()}",
+            )
+            for _ in range(count)
+        ]
+
+        start = time.perf_counter()
+        for attachment in attachments:
+            sign_with_new_client(attachment)
+        before = time.perf_counter() - start
+
+        signed_url_cache.clear()
+        start = time.perf_counter()
+        EventAttachmentSerializer(attachments, many=True).data
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        EventAttachmentSerializer(attachments, many=True).data
+        warm = time.perf_counter() - start
+
+        self.stdout.write(f"attachments:                 {count}")
+        self.stdout.write(f"new client per attachment:   {before:.3f}s")
+        self.stdout.write(f"shared client, cold cache:   {cold:.3f}s")
+        self.stdout.write(f"shared client, warm cache:   {warm:.3f}s")
+        self.stdout.write(
+            f"speedup (cold / warm):       {before / cold:.1f}x / {before / warm:.1f}x"
+        )
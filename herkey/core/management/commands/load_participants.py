@@ -0,0 +1,100 @@
+""" Load a large participant list into an event with Postgres COPY. """
+
+import csv
+import io
+import time
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.event_cache import invalidate_event
+from core.models import Event, EventParticipant
+
+STAGING_TABLE = "core_eventparticipant_import"
+
+
+class Command(BaseCommand):
+    help = (
+        "COPY user ids from a CSV file (one per row, optional header) into a "
+        "staging table, then insert them as participants of an event, skipping "
+        "unknown users and existing registrations. Postgres only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_id")
+        parser.add_argument("csv_path")
+        parser.add_argument(
+            "--type",
+            default="PARTICIPANT",
+            choices=[choice for choice, _ in EventParticipant.PARTICIPANT_TYPE],
+        )
+        parser.add_argument("--chunk-size", type=int, default=50000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("load_participants requires PostgreSQL COPY")
+        try:
+            event = Event.objects.get(pk=options["event_id"])
+        except (Event.DoesNotExist, ValidationError) as e:
+            raise CommandError(f"Event {options['event_id']} not found") from e
+
+        start = time.perf_counter()
+        copied = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {STAGING_TABLE} (user_id integer NOT NULL) "
+                "ON COMMIT DROP"
+            )
+            with open(options["csv_path"], newline="", encoding="utf-8") as csv_file:
+                for chunk in self.read_chunks(csv_file, options["chunk_size"]):
+                    cursor.copy_expert(
+                        f"COPY {STAGING_TABLE} (user_id) FROM STDIN", io.StringIO(chunk)
+                    )
+                    copied += chunk.count("\n")
+                    self.report("copied", copied, start)
+
+            cursor.execute(
+                f"""
+                INSERT INTO {EventParticipant._meta.db_table}
+                    (id, created, modified, event_id, user_id, active, type)
+                SELECT gen_random_uuid(), now(), now(), %s, staging.user_id, true, %s
+                FROM (SELECT DISTINCT user_id FROM {STAGING_TABLE}) AS staging
+                JOIN {User._meta.db_table} AS users ON users.id = staging.user_id
+                ON CONFLICT (event_id, user_id) DO NOTHING
+                """,
+                [str(event.pk), options["type"]],
+            )
+            inserted = cursor.rowcount
+            Event.objects.filter(pk=event.pk).recount()
+            invalidate_event(event.pk)
+
+        self.report("inserted", inserted, start)
+        self.stdout.write(
+            f"Done: {copied} rows read, {inserted} participants added, "
+            f"{copied - inserted} skipped as unknown or already registered"
+        )
+
+    def read_chunks(self, csv_file, chunk_size):
+        """Yield COPY text payloads of up to ``chunk_size`` user ids."""
+        lines = []
+        for position, row in enumerate(csv.reader(csv_file)):
+            if not row or not row[0].strip():
+                continue
+            value = row[0].strip()
+            if not value.isdigit():
+                if position == 0:
+                    continue
+                raise CommandError(f"Row {position + 1}: {value!r} is not a user id")
+            lines.append(value)
+            if len(lines) == chunk_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    def report(self, label, rows, start):
+        seconds = time.perf_counter() - start
+        rate = rows / seconds if seconds else 0
+        self.stdout.write(f"{label} {rows} rows in {seconds:.1f}s ({rate:.0f} rows/s)")
@@ -0,0 +1,34 @@
+""" Pre-mint Agora tokens for every participant of an event. """
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Event
+from core.premint import premint_event_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Mint RTC/RTM tokens for every participant of an event across a process "
+        "pool and store them, so the agora-token endpoint becomes a lookup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_id")
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--chunk-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(pk=options["event_id"])
+        except (Event.DoesNotExist, ValidationError) as e:
+            raise CommandError(f"Event {options['event_id']} not found") from e
+
+        result = premint_event_tokens(
+            event, workers=options["workers"], chunk_size=options["chunk_size"]
+        )
+        self.stdout.write(
+            f"Minted {result['tokens']} tokens for {result['participants']} "
+            f"participants in {result['seconds']}s "
+            f"({result['tokens_per_second']} tokens/s)"
+        )
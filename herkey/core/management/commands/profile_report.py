@@ -0,0 +1,56 @@
+""" Rank the hottest functions across the saved request profiles. """
+
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import SUFFIX, rank_functions, read_profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Add up the request profiles saved by ProfilingMiddleware and rank "
+        "functions by the samples they were running in (self) or on the stack "
+        "for (total). --output writes the merged collapsed stacks for "
+        "flamegraph tools."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=settings.PROFILER_DIR)
+        parser.add_argument(
+            "--view",
+            help="Only profiles of this view name, such as event-list.",
+        )
+        parser.add_argument("--sort", choices=("self", "total"), default="self")
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--output", help="Write the merged stacks here.")
+
+    def handle(self, *args, **options):
+        paths = sorted(Path(options["dir"]).glob(f"*{SUFFIX}"))
+        if options["view"]:
+            paths = [path for path in paths if f"-{options['view']}-" in path.name]
+        if not paths:
+            raise CommandError(f"No profiles in {options['dir']}")
+        stacks = Counter()
+        for path in paths:
+            stacks.update(read_profile(path))
+        samples = sum(stacks.values())
+        if not samples:
+            raise CommandError("The profiles hold no samples")
+        own, total = rank_functions(stacks)
+        ranked = own if options["sort"] == "self" else total
+        self.stdout.write(
+            f"{samples} samples from {len(paths)} profiles, by {options['sort']}"
+        )
+        self.stdout.write(f"{'self':>7} {'total':>7}  function")
+        for function, _ in ranked.most_common(options["limit"]):
+            self.stdout.write(
+                f"{own[function] / samples:7.1%} {total[function] / samples:7.1%}"
+                f"  {function}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                for stack, count in stacks.most_common():
+                    output.write(f"{stack} {count}\n")
@@ -0,0 +1,34 @@
+""" Repair drift in the denormalized Event counters. """
+
+from django.core.management.base import BaseCommand
+
+from core.event_cache import invalidate_event
+from core.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Find events whose participant, host or attachment counts disagree "
+        "with their child rows and recompute them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report drifted events."
+        )
+
+    def handle(self, *args, **options):
+        drifted = Event.objects.drifted()
+        for event in drifted:
+            self.stdout.write(
+                f"{event.pk}: participants {event.participant_count}->"
+                f"{event.actual_participant_count}, hosts {event.host_count}->"
+                f"{event.actual_host_count}, attachments {event.attachment_count}->"
+                f"{event.actual_attachment_count}"
+            )
+        if options["dry_run"]:
+            return
+        repaired = Event.objects.filter(pk__in=drifted.values("pk")).recount()
+        for event in drifted:
+            invalidate_event(event.pk)
+        self.stdout.write(f"Repaired {repaired} events")
@@ -0,0 +1,109 @@
+""" Serve the API with gunicorn: the app preloaded, workers forked from it. """
+
+import glob
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import get_internal_wsgi_application
+from django.db import connections
+from django.utils.module_loading import import_string
+from gunicorn.app.base import BaseApplication
+from prometheus_client import multiprocess
+
+from core.db.pooled_postgresql.base import close_pools
+
+# Worker classes that speak ASGI rather than WSGI
+ASGI_WORKER_CLASSES = (
+    "uvicorn.workers.UvicornWorker",
+    "uvicorn.workers.UvicornH11Worker",
+)
+
+
+def close_connections(server, worker):
+    """
+    Close the master's database connections before a fork, so workers open
+    their own instead of sharing its sockets."""
+    connections.close_all()
+    close_pools()
+
+
+def mark_metrics_dead(server, worker):
+    """
+    Drop the live gauge files of a worker that exited, recycled or crashed,
+    so its gauges stop being reported. Its counter and histogram files stay,
+    since totals would otherwise go backwards."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def clear_metrics_dir():
+    """
+    Empty PROMETHEUS_MULTIPROC_DIR, where workers keep their metrics, so a
+    restarted server does not report the previous one's."""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for name in glob.glob(os.path.join(path, "*.db")):
+            os.remove(name)
+
+
+class Server(BaseApplication):
+    """A gunicorn application serving an already loaded WSGI/ASGI app."""
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the API in production: gunicorn with the Django app loaded once "
+        "and SERVER_WORKERS workers forked from it, each recycled after about "
+        "SERVER_MAX_REQUESTS requests. gthread workers serve herkey.wsgi; "
+        "uvicorn workers, the default with ASYNC_VIEWS, serve herkey.asgi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default=settings.SERVER_BIND)
+        parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS)
+        parser.add_argument("--threads", type=int, default=settings.SERVER_THREADS)
+        parser.add_argument("--worker-class", default=settings.SERVER_WORKER_CLASS)
+        parser.add_argument(
+            "--max-requests", type=int, default=settings.SERVER_MAX_REQUESTS
+        )
+
+    def handle(self, *args, **options):
+        clear_metrics_dir()
+        worker_class = options["worker_class"]
+        if worker_class in ASGI_WORKER_CLASSES:
+            application = import_string(settings.ASGI_APPLICATION)
+        else:
+            application = get_internal_wsgi_application()
+        Server(
+            application,
+            {
+                "bind": options["bind"],
+                "workers": options["workers"],
+                "worker_class": worker_class,
+                "threads": options["threads"],
+                "preload_app": True,
+                "pre_fork": close_connections,
+                "child_exit": mark_metrics_dead,
+                # Jitter keeps workers from all restarting at the same time
+                "max_requests": options["max_requests"],
+                "max_requests_jitter": settings.SERVER_MAX_REQUESTS_JITTER,
+                "timeout": settings.SERVER_TIMEOUT,
+                "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT,
+                "keepalive": settings.SERVER_KEEPALIVE,
+                "accesslog": settings.SERVER_ACCESS_LOG,
+            },
+        ).run()
@@ -0,0 +1,137 @@
+"""
+Prometheus metrics of the API: per-route request latency, status and
+response size, the SQL each request runs, and the time spent in S3 and
+Agora calls. MetricsMiddleware records them and the ``metrics`` view serves
+them at /metrics.
+
+Each process keeps its own values. Under gunicorn, set
+PROMETHEUS_MULTIPROC_DIR so workers write them to files there and /metrics
+adds up those of every worker, see the README.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Requests that did not resolve to a route, such as 404s
+UNMATCHED_ROUTE = "<unmatched>"
+
+REQUESTS = Counter(
+    "herkey_http_requests",
+    "HTTP requests by route, method and status code.",
+    ["route", "method", "status"],
+)
+REQUEST_SECONDS = Histogram(
+    "herkey_http_request_duration_seconds",
+    "Time to build a response, by route and method.",
+    ["route", "method"],
+)
+RESPONSE_BYTES = Histogram(
+    "herkey_http_response_size_bytes",
+    "Size of non-streaming response bodies, by route.",
+    ["route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+REQUEST_QUERIES = Histogram(
+    "herkey_http_request_db_queries",
+    "SQL queries run per request, by route.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_QUERY_SECONDS = Histogram(
+    "herkey_http_request_db_seconds",
+    "Time spent running SQL per request, by route.",
+    ["route"],
+)
+OUTBOUND_SECONDS = Histogram(
+    "herkey_outbound_call_duration_seconds",
+    "Time spent in S3 and Agora calls, by service and operation.",
+    ["service", "operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+class RequestStats:
+    """SQL run on behalf of one request."""
+
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+# The stats of the current request. Threads running a request's queries for
+# an async view share them through the copied context.
+_request_stats = ContextVar("request_stats", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """An execute_wrapper counting and timing queries of the current request."""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_seconds += time.perf_counter() - start
+        stats.queries += 1
+
+
+def instrument_connection(connection):
+    """Install record_query on ``connection``, once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def start_request():
+    stats = RequestStats()
+    _request_stats.set(stats)
+    return stats
+
+
+def finish_request(request, response, stats, seconds):
+    """Record a finished request and stop counting its queries."""
+    _request_stats.set(None)
+    match = getattr(request, "resolver_match", None)
+    route = match.route if match is not None else UNMATCHED_ROUTE
+    REQUESTS.labels(route, request.method, response.status_code).inc()
+    REQUEST_SECONDS.labels(route, request.method).observe(seconds)
+    REQUEST_QUERIES.labels(route).observe(stats.queries)
+    REQUEST_QUERY_SECONDS.labels(route).observe(stats.query_seconds)
+    if not response.streaming:
+        RESPONSE_BYTES.labels(route).observe(len(response.content))
+
+
+@contextmanager
+def timed(service, operation):
+    """Time the block as an outbound ``service`` call."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        OUTBOUND_SECONDS.labels(service, operation).observe(
+            time.perf_counter() - start
+        )
+
+
+def render_metrics():
+    """Return the metrics in Prometheus' text format, and its content type."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,120 @@
+""" Request middleware of the API. """
+
+import time
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+from . import metrics, profiling, routers
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    Record each request's latency, status, response size and SQL in the
+    metrics of core/metrics.py, by route. Goes first in MIDDLEWARE, so the
+    time spent in other middleware is counted.
+    """
+
+    def process_request(self, request):
+        request._metrics = (metrics.start_request(), time.perf_counter())
+
+    def process_response(self, request, response):
+        stats, start = request._metrics
+        metrics.finish_request(
+            request, response, stats, time.perf_counter() - start
+        )
+        return response
+
+    async def __acall__(self, request):
+        # Recording does no I/O, so under ASGI it stays on the event loop
+        # instead of going through MiddlewareMixin's thread for the hooks
+        self.process_request(request)
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Let safe-method requests read from the database replicas, see
+    core/routers.py, and keep a client that just wrote reading from the
+    primary for DATABASE_REPLICA_PIN_SECONDS, so it reads its own writes.
+    """
+
+    def process_request(self, request):
+        routers.read_from_replicas(
+            self.may_read_from_replicas(request)
+            and not routers.is_pinned_to_primary(request)
+        )
+
+    def process_response(self, request, response):
+        if self.pins_to_primary(request, response):
+            routers.pin_to_primary(request)
+        return response
+
+    async def __acall__(self, request):
+        # Under ASGI only the pin lookups leave the event loop, and only
+        # when there are replicas
+        routers.read_from_replicas(
+            self.may_read_from_replicas(request)
+            and not await routers.ais_pinned_to_primary(request)
+        )
+        response = await self.get_response(request)
+        if self.pins_to_primary(request, response):
+            await routers.apin_to_primary(request)
+        return response
+
+    def may_read_from_replicas(self, request):
+        return bool(settings.DATABASE_REPLICAS) and request.method in SAFE_METHODS
+
+    def pins_to_primary(self, request, response):
+        return bool(
+            settings.DATABASE_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        )
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """
+    Sample the stack of the views of requests chosen by
+    profiling.should_profile and save it to PROFILER_DIR, see
+    core/profiling.py. Goes last in MIDDLEWARE, so profiles cover the view.
+    Responses to requests asking for a profile name the file in their
+    PROFILER_HEADER header.
+
+    Under ASGI the event loop's thread is sampled, which misses the parts
+    of an async view run in other threads.
+    """
+
+    def __call__(self, request):
+        if self._is_coroutine:
+            return self.__acall__(request)
+        if not profiling.should_profile(request):
+            return self.get_response(request)
+        start = time.perf_counter()
+        with profiling.profiler() as sampler:
+            response = self.get_response(request)
+        return self.finish(request, response, sampler, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # Authenticating may query, so it runs in a thread, and only for
+        # requests asking for a profile
+        profile = profiling.sampled() or (
+            request.headers.get(settings.PROFILER_HEADER)
+            and await sync_to_async(profiling.requested_by_admin)(request)
+        )
+        if not profile:
+            return await self.get_response(request)
+        start = time.perf_counter()
+        with profiling.profiler() as sampler:
+            response = await self.get_response(request)
+        return self.finish(request, response, sampler, time.perf_counter() - start)
+
+    def finish(self, request, response, sampler, seconds):
+        name = profiling.save_profile(request, sampler, seconds)
+        if request.headers.get(settings.PROFILER_HEADER):
+            response.headers[settings.PROFILER_HEADER] = name
+        return response
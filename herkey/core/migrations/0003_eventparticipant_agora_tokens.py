@@ -0,0 +1,18 @@
+# Generated by Django 4.1.3 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_event_end_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventparticipant',
+            name='agora_tokens',
+            field=models.JSONField(blank=True, null=True, verbose_name='Agora Tokens'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.3 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+def remove_duplicate_participants(apps, schema_editor):
+    """Keep the earliest registration of each (event, user) pair."""
+    EventParticipant = apps.get_model('core', 'EventParticipant')
+    seen = set()
+    duplicates = []
+    for participant_id, event_id, user_id in EventParticipant.objects.order_by(
+        'created', 'id'
+    ).values_list('id', 'event_id', 'user_id').iterator():
+        if (event_id, user_id) in seen:
+            duplicates.append(participant_id)
+        else:
+            seen.add((event_id, user_id))
+    EventParticipant.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_eventparticipant_agora_tokens'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_participants, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='eventparticipant',
+            constraint=models.UniqueConstraint(fields=('event', 'user'), name='unique_event_participant'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.1.3 on 2026-10-18 16:00
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Event = apps.get_model('core', 'Event')
+    EventParticipant = apps.get_model('core', 'EventParticipant')
+    EventAttachment = apps.get_model('core', 'EventAttachment')
+
+    def child_count(model, **filters):
+        return Coalesce(
+            models.Subquery(
+                model.objects.filter(event=models.OuterRef('pk'), **filters)
+                .order_by()
+                .values('event')
+                .annotate(count=models.Count('pk'))
+                .values('count')
+            ),
+            0,
+        )
+
+    Event.objects.update(
+        participant_count=child_count(EventParticipant),
+        host_count=child_count(EventParticipant, type='HOST'),
+        attachment_count=child_count(EventAttachment),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_eventparticipant_unique_event_participant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='attachment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Attachment Count'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='host_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Host Count'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Participant Count'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.3 on 2026-10-18 16:14
+
+import core.db.operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Indexes on these busy tables are built without blocking writes
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_event_counters'),
+    ]
+
+    operations = [
+        core.db.operations.AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['-created', '-id'], name='event_created_id_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['type', 'scheduled_date'], name='event_type_scheduled_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='eventparticipant',
+            index=models.Index(fields=['event', '-created', '-id'], name='participant_event_created_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='eventparticipant',
+            index=models.Index(fields=['-created', '-id'], name='participant_created_id_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='eventparticipant',
+            index=models.Index(fields=['event', 'modified'], name='participant_event_modified_idx'),
+        ),
+    ]
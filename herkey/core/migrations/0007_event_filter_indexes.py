@@ -0,0 +1,29 @@
+# Generated by Django 4.1.3 on 2026-10-18 16:15
+
+import core.db.operations
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Indexes on these busy tables are built without blocking writes
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_composite_indexes'),
+    ]
+
+    operations = [
+        core.db.operations.AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['scheduled_date'], name='event_scheduled_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['end_date'], name='event_end_date_idx'),
+        ),
+        core.db.operations.AddIndexConcurrently(
+            model_name='event',
+            index=models.Index(fields=['active', '-created', '-id'], name='event_active_created_idx'),
+        ),
+    ]
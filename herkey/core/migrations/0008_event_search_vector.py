@@ -0,0 +1,53 @@
+# Generated by Django 4.1.3 on 2026-10-18 16:17
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Titles weigh more than descriptions in the search rank. Keep the config in
+# step with core.models.SEARCH_CONFIG. Existing rows are filled in by 0009 and
+# indexed by 0010, without holding locks on the whole table.
+CREATE_SEARCH_TRIGGER = """
+CREATE FUNCTION core_event_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_event_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON core_event
+    FOR EACH ROW EXECUTE FUNCTION core_event_search_vector_update();
+"""
+
+DROP_SEARCH_TRIGGER = """
+DROP TRIGGER IF EXISTS core_event_search_vector_trigger ON core_event;
+DROP FUNCTION IF EXISTS core_event_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_TRIGGER)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_event_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.3 on 2026-10-18 18:02
+
+from django.db import migrations, models, transaction
+
+# Rows updated per transaction, so each batch holds row locks only briefly
+BATCH_SIZE = 1000
+
+
+def backfill_search_vector(apps, schema_editor):
+    """
+    Touch every event's title in pk order, one batch per transaction, so the
+    search trigger from 0008 fills in search_vector."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Event = apps.get_model('core', 'Event')
+    events = Event.objects.using(schema_editor.connection.alias).order_by('pk')
+    last = None
+    while True:
+        batch = events if last is None else events.filter(pk__gt=last)
+        pks = list(batch.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            break
+        with transaction.atomic(using=schema_editor.connection.alias):
+            events.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(
+                title=models.F('title')
+            )
+        last = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_event_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+    ]
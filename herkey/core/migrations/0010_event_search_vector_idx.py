@@ -0,0 +1,22 @@
+# Generated by Django 4.1.3 on 2026-10-18 18:03
+
+import core.db.operations
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # The index is built without blocking writes to the events table
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_backfill_event_search_vector'),
+    ]
+
+    operations = [
+        core.db.operations.AddIndexConcurrently(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='event_search_vector_idx'),
+        ),
+    ]
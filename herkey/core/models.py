@@ -1,19 +1,279 @@
 """	Models for the core app	"""
 
-from django.db import models
+import re
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connections, models, transaction
+from django.db.models.functions import Coalesce, Greatest, Now
 from django.contrib.auth.models import User
 from utils.model_abstract import Model
 from django_extensions.db.models import (
     TimeStampedModel,
     ActivatorModel,
+    ActivatorQuerySet,
     TitleDescriptionModel,
 )
 
+from .event_cache import invalidate_event
+
+
+# Text search configuration of Event.search_vector, see migrations 0008-0010
+SEARCH_CONFIG = "english"
+
+
+class EventQuerySet(ActivatorQuerySet):
+
+    def with_related(self, participants=True, attachments=True):
+        """
+        Prefetch participants (with their users) and attachments so that
+        serializing any number of events runs a fixed number of queries."""
+        lookups = []
+        if participants:
+            lookups.append(
+                models.Prefetch(
+                    "participants",
+                    queryset=EventParticipant.objects.select_related(
+                        "user"
+                    ).defer("agora_tokens"),
+                )
+            )
+        if attachments:
+            lookups.append("attachments")
+        return self.prefetch_related(*lookups)
+
+    def with_last_modified(self, participants=True, attachments=True):
+        """
+        Annotate each event with ``last_modified``, the latest ``modified`` of
+        the event and of its participants and/or attachments."""
+        timestamps = [models.F("modified")]
+        if participants:
+            timestamps.append(_child_max_modified(EventParticipant))
+        if attachments:
+            timestamps.append(_child_max_modified(EventAttachment))
+        if len(timestamps) == 1:
+            return self.annotate(last_modified=timestamps[0])
+        return self.annotate(last_modified=Greatest(*timestamps))
+
+    def search(self, text):
+        """
+        Events whose title or description has a word starting with each word
+        of ``text``, annotated with a ``rank`` to order by, best first.
+
+        On PostgreSQL this is answered by the GIN index on ``search_vector``;
+        other databases fall back to unranked ``icontains`` matching.
+        """
+        words = re.findall(r"\w+", text)
+        unranked = models.Value(0.0, output_field=models.FloatField())
+        if not words:
+            return self.none().annotate(rank=unranked)
+        if connections[self.db].vendor != "postgresql":
+            matches = models.Q()
+            for word in words:
+                matches &= models.Q(title__icontains=word) | models.Q(
+                    description__icontains=word
+                )
+            return self.filter(matches).annotate(rank=unranked)
+        query = SearchQuery(
+            " & ".join(f"{word}:*" for word in words),
+            config=SEARCH_CONFIG,
+            search_type="raw",
+        )
+        return self.filter(search_vector=query).annotate(
+            rank=SearchRank(models.F("search_vector"), query)
+        )
+
+    def adjust_counts(self, participants=0, hosts=0, attachments=0):
+        """
+        Add the given deltas to the denormalized counters of these events.
+        ``modified`` moves too, so deleting a child changes Last-Modified."""
+        return self.update(
+            participant_count=models.F("participant_count") + participants,
+            host_count=models.F("host_count") + hosts,
+            attachment_count=models.F("attachment_count") + attachments,
+            modified=Now(),
+        )
+
+    def with_actual_counts(self):
+        """Annotate each event with counts computed from its child rows."""
+        return self.annotate(
+            actual_participant_count=_child_count(EventParticipant),
+            actual_host_count=_child_count(EventParticipant, type="HOST"),
+            actual_attachment_count=_child_count(EventAttachment),
+        )
+
+    def drifted(self):
+        """Events whose stored counters disagree with their child rows."""
+        return self.with_actual_counts().exclude(
+            participant_count=models.F("actual_participant_count"),
+            host_count=models.F("actual_host_count"),
+            attachment_count=models.F("actual_attachment_count"),
+        )
+
+    def recount(self):
+        """
+        Recompute the stored counters of these events in one UPDATE, moving
+        ``modified`` as ``adjust_counts()`` does."""
+        return self.update(
+            participant_count=_child_count(EventParticipant),
+            host_count=_child_count(EventParticipant, type="HOST"),
+            attachment_count=_child_count(EventAttachment),
+            modified=Now(),
+        )
+
+
+def _child_count(model, **filters):
+    """A correlated subquery counting ``model`` rows of the outer event."""
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(event=models.OuterRef("pk"), **filters)
+            .order_by()
+            .values("event")
+            .annotate(count=models.Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def _child_max_modified(model):
+    """
+    A correlated subquery for the latest ``modified`` of ``model`` rows of the
+    outer event, falling back to the event's own when it has none."""
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(event=models.OuterRef("pk"))
+            .order_by()
+            .values("event")
+            .annotate(latest=models.Max("modified"))
+            .values("latest")
+        ),
+        models.F("modified"),
+    )
+
+
+class EventParticipantQuerySet(models.QuerySet):
+
+    def register(self, event_id, user, **fields):
+        """
+        Insert a participant in one statement, relying on the
+        ``unique_event_participant`` constraint instead of a prior read.
+
+        Returns the new participant, or None if the user was already
+        registered for the event. Raises Event.DoesNotExist, rolling the
+        insert back, when the counter update finds no event, since the
+        deferred foreign key check would only fail at commit. Inserts bypass
+        signals, so the event's counters are adjusted and its cached
+        documents invalidated here.
+
+        The counter update locks the event row until commit, so concurrent
+        registrations for one event take turns on it. That window is one
+        statement and a commit long; ``bench_registration`` compares it to
+        registrations spread over many events.
+
+        ``user`` may be a token-backed user, of which only the id is used.
+        """
+        participant = self.model(event_id=event_id, user_id=user.pk, **fields)
+        if isinstance(user, User):
+            participant.user = user
+        with transaction.atomic(using=self.db):
+            if not self._insert_new([participant]):
+                return None
+            updated = Event.objects.using(self.db).filter(pk=event_id).adjust_counts(
+                participants=1, hosts=int(participant.type == "HOST")
+            )
+            if not updated:
+                raise Event.DoesNotExist(f"No event {event_id}")
+            invalidate_event(event_id)
+        participant._state.adding = False
+        participant._state.db = self.db
+        return participant
+
+    def _insert_new(self, participants):
+        """
+        Insert ``participants`` in one INSERT ... ON CONFLICT DO NOTHING on
+        ``unique_event_participant`` and return how many rows it inserted,
+        which leaves out users already registered."""
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        concrete_fields = self.model._meta.concrete_fields
+        row = f"({', '.join(['%s'] * len(concrete_fields))})"
+        values = [
+            field.get_db_prep_save(field.pre_save(participant, True), connection)
+            for participant in participants
+            for field in concrete_fields
+        ]
+        sql = (
+            f"INSERT INTO {quote_name(self.model._meta.db_table)} "
+            f"({', '.join(quote_name(field.column) for field in concrete_fields)}) "
+            f"VALUES {', '.join([row] * len(participants))} "
+            f"ON CONFLICT ({quote_name('event_id')}, {quote_name('user_id')}) "
+            f"DO NOTHING RETURNING {quote_name(self.model._meta.pk.column)}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, values)
+            return len(cursor.fetchall())
+
+    def bulk_register(self, event, user_ids, chunk_size=1000, **fields):
+        """
+        Register many users for ``event`` in chunks of inserts with conflicts
+        ignored, so users already registered are skipped.
+
+        Returns ``(added, unknown_user_ids)``, counting only the rows these
+        inserts added, not registrations made concurrently.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        added = 0
+        unknown = []
+        for index in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[index : index + chunk_size]
+            existing = set(
+                User.objects.filter(id__in=chunk).values_list("id", flat=True)
+            )
+            unknown.extend(user_id for user_id in chunk if user_id not in existing)
+            participants = [
+                self.model(event=event, user_id=user_id, **fields)
+                for user_id in chunk
+                if user_id in existing
+            ]
+            if not participants:
+                continue
+            with transaction.atomic(using=self.db):
+                added += self._insert_new(participants)
+                Event.objects.using(self.db).filter(pk=event.pk).recount()
+                invalidate_event(event.pk)
+        event.refresh_from_db(fields=["participant_count", "host_count"])
+        return added, unknown
+
 
 class Event(TimeStampedModel, ActivatorModel, TitleDescriptionModel, Model):
 
     class Meta:
         verbose_name_plural = "Events"
+        indexes = [
+            # Keyset pagination of event lists, newest first
+            models.Index(fields=["-created", "-id"], name="event_created_id_idx"),
+            # Lifecycle queries, e.g. scheduled events starting in a window
+            models.Index(
+                fields=["type", "scheduled_date"], name="event_type_scheduled_idx"
+            ),
+            # Date window filters and sorts without a type
+            models.Index(fields=["scheduled_date"], name="event_scheduled_idx"),
+            models.Index(fields=["end_date"], name="event_end_date_idx"),
+            # Active or inactive events, newest first
+            models.Index(
+                fields=["active", "-created", "-id"], name="event_active_created_idx"
+            ),
+            # Full-text search, see search()
+            GinIndex(fields=["search_vector"], name="event_search_vector_idx"),
+        ]
+
+    class JSONAPIMeta:
+        # The type event resources are rendered with, also used by
+        # relationships pointing at events
+        resource_name = "event"
+
+    objects = EventQuerySet.as_manager()
 
     # Define the choices for the type field
     TYPE_CHOICES = [
@@ -39,6 +299,23 @@ class Event(TimeStampedModel, ActivatorModel, TitleDescriptionModel, Model):
         null=True, blank=True, max_length=100, verbose_name="Stream Session ID"
     )
 
+    # Denormalized counts of child rows, maintained by core.signals
+    participant_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Participant Count"
+    )
+
+    host_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Host Count"
+    )
+
+    attachment_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Attachment Count"
+    )
+
+    # Weighted title/description lexemes, maintained by a database trigger
+    # and GIN-indexed on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
     def __str__(self):
         return f"{self.title}"
 
@@ -47,6 +324,30 @@ class EventParticipant(TimeStampedModel, Model):
 
     class Meta:
         verbose_name_plural = "Events_Participants"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "user"],
+                name="unique_event_participant",
+            )
+        ]
+        # (event, user) and (user, event) lookups use unique_event_participant
+        indexes = [
+            # Participants of one event in page/stream order
+            models.Index(
+                fields=["event", "-created", "-id"],
+                name="participant_event_created_idx",
+            ),
+            # Keyset pagination of the participant list
+            models.Index(
+                fields=["-created", "-id"], name="participant_created_id_idx"
+            ),
+            # Latest modified per event, for conditional GETs
+            models.Index(
+                fields=["event", "modified"], name="participant_event_modified_idx"
+            ),
+        ]
+
+    objects = EventParticipantQuerySet.as_manager()
 
     event = models.ForeignKey(
         Event,
@@ -75,6 +376,14 @@ class EventParticipant(TimeStampedModel, Model):
         verbose_name="Type",
     )
 
+    # RTC/RTM tokens minted ahead of time by premint_event_tokens
+    agora_tokens = models.JSONField(null=True, blank=True, verbose_name="Agora Tokens")
+
+    def save(self, *args, **kwargs):
+        # Keep the row and the event counters updated by post_save together
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return "event_participants"
 
@@ -120,5 +429,10 @@ class EventAttachment(TimeStampedModel, Model):
 
     active = models.BooleanField(default=True, verbose_name="Active")
 
+    def save(self, *args, **kwargs):
+        # Keep the row and the event counters updated by post_save together
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return "event_attachments"
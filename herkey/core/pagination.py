@@ -0,0 +1,189 @@
+""" Pagination classes for the core app. """
+
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+
+from .filters import nullable_fields, order_by_nulls_last
+
+
+def reverse_ordering(ordering):
+    return tuple(
+        field[1:] if field.startswith("-") else f"-{field}" for field in ordering
+    )
+
+
+def keyset_filter(ordering, values, nullable=(), nulls_last=True):
+    """
+    Match the rows sorting after ``values`` in ``ordering``, comparing the
+    columns as a tuple. Each column is bounded inclusively on its own as
+    well, so the first one can be answered from an index.
+
+    NULLs of the ``nullable`` fields sort last, or first, as
+    ``order_by_nulls_last()`` puts them. The last field must not be
+    nullable."""
+    (field, *rest), (value, *rest_values) = ordering, values
+    name = field.lstrip("-")
+    lookup = "lt" if field.startswith("-") else "gt"
+    after = Q(**{f"{name}__{lookup}": value})
+    if not rest:
+        return after
+    rest = keyset_filter(rest, rest_values, nullable, nulls_last)
+    if name not in nullable:
+        return Q(**{f"{name}__{lookup}e": value}) & (after | rest)
+    is_null = Q(**{f"{name}__isnull": True})
+    if value is None:
+        # Comparisons with NULL match nothing, so NULLs are matched apart
+        return is_null & rest if nulls_last else ~is_null | (is_null & rest)
+    if nulls_last:
+        return (Q(**{f"{name}__{lookup}e": value}) | is_null) & (
+            after | is_null | rest
+        )
+    return Q(**{f"{name}__{lookup}e": value}) & (after | rest)
+
+
+class JsonApiCursorPagination(CursorPagination):
+    """
+    Keyset pagination with opaque cursors and JSON:API ``page[...]`` query
+    parameters and ``links``.
+
+    Cursors hold the value of every ordering column of the row they point
+    at, ``(created, id)`` by default. Orderings end in a unique column, so
+    positions are unique and pages never fall back to offsets, unlike DRF's
+    cursors, which key on the first column only. Rows with NULL in a sorted
+    column come last."""
+
+    cursor_query_param = "page[cursor]"
+    page_size_query_param = "page[size]"
+    page_size = settings.PAGE_SIZE
+    max_page_size = settings.MAX_PAGE_SIZE
+    ordering = ("-created", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor is not None else None
+
+        ordering = reverse_ordering(self.ordering) if reverse else self.ordering
+        # NULLs sort last, so walking backwards meets them first
+        nullable = nullable_fields(queryset.model, ordering)
+        queryset = queryset.order_by(
+            *order_by_nulls_last(ordering, nullable, nulls_last=not reverse)
+        )
+        if position is not None:
+            try:
+                queryset = queryset.filter(
+                    keyset_filter(ordering, position, nullable, not reverse)
+                )
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[: self.page_size + 1])
+        self.page = results[: self.page_size]
+        has_following = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+        # A page reached through a cursor has rows on the side it came from
+        self.has_next = position is not None if reverse else has_following
+        self.has_previous = has_following if reverse else position is not None
+        if self.page:
+            self.next_position = self.get_position(self.page[-1])
+            self.previous_position = self.get_position(self.page[0])
+        else:
+            # An empty page links back to where its cursor pointed
+            self.next_position = self.previous_position = position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.previous_position)
+        )
+
+    def get_position(self, row):
+        """The values of the ordering columns of a model instance or dict."""
+        names = [field.lstrip("-") for field in self.ordering]
+        if isinstance(row, dict):
+            values = [row[name] for name in names]
+        else:
+            values = [getattr(row, name) for name in names]
+        return [None if value is None else str(value) for value in values]
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+    def encode_cursor(self, cursor):
+        if cursor.position is not None:
+            cursor = cursor._replace(position=json.dumps(cursor.position))
+        return super().encode_cursor(cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "results": data,
+                "meta": {"pagination": {"page_size": self.page_size}},
+                "links": OrderedDict(
+                    [
+                        ("next", self.get_next_link()),
+                        ("prev", self.get_previous_link()),
+                    ]
+                ),
+            }
+        )
+
+
+class UserCursorPagination(JsonApiCursorPagination):
+    """
+    Users have no ``created`` column; their auto-increment id is already a
+    unique, monotonic key."""
+
+    ordering = ("id",)
+
+
+class PaginatedViewSetMixin:
+    """
+    Pagination for plain ``ViewSet`` classes, which do not get
+    ``paginate_queryset`` from ``GenericAPIView``."""
+
+    pagination_class = JsonApiCursorPagination
+
+    def get_page_ordering(self, queryset):
+        """The ordering pages of ``queryset`` are cut on, after any ``sort``."""
+        return self.pagination_class().get_ordering(self.request, queryset, self)
+
+    def paginated_response(self, queryset, serializer_class, **kwargs):
+        """
+        Serialize one page of ``queryset`` and wrap it in a paginated response."""
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, self.request, view=self)
+        serializer = serializer_class(page, many=True, **kwargs)
+        return paginator.get_paginated_response(serializer.data)
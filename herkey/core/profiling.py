@@ -0,0 +1,115 @@
+"""
+On-demand profiling of live requests.
+
+ProfilingMiddleware samples the stack of a request's view while it runs,
+see utils/profiler.py. It does so for requests from admins sending the
+PROFILER_HEADER header, and for a PROFILER_SAMPLE_RATE fraction of all
+requests. Each profile is saved as collapsed stacks in PROFILER_DIR, keeping
+the newest PROFILER_MAX_FILES. ``python manage.py profile_report`` ranks the
+hottest functions across them.
+"""
+
+import os
+import random
+import re
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+from utils.profiler import StackSampler
+
+SUFFIX = ".folded"
+
+
+def requested_by_admin(request):
+    """
+    Whether ``request`` carries the profiling header and an admin's
+    credentials. The API's authenticators run here, ahead of the view, so
+    only for requests that send the header."""
+    if not request.headers.get(settings.PROFILER_HEADER):
+        return False
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except APIException:
+            return False
+        if result is not None:
+            return bool(result[0].is_staff)
+    return False
+
+
+def sampled():
+    """Pick requests to profile at PROFILER_SAMPLE_RATE."""
+    rate = settings.PROFILER_SAMPLE_RATE
+    return bool(rate) and random.random() < rate
+
+
+def should_profile(request):
+    return sampled() or requested_by_admin(request)
+
+
+def profiler():
+    return StackSampler(interval=settings.PROFILER_INTERVAL)
+
+
+def profile_name(request, seconds):
+    """
+    Name a profile by its time, process, view and duration, for example
+    ``20261018T170102.123456-4242-event-list-84ms.folded``."""
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match is not None else "unmatched"
+    view = re.sub(r"[^\w.-]", "_", view)
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    micros = int(time.time() * 1e6) % 1_000_000
+    duration = round(seconds * 1000)
+    return f"{stamp}.{micros:06d}-{os.getpid()}-{view}-{duration}ms{SUFFIX}"
+
+
+def save_profile(request, sampler, seconds):
+    """Write ``sampler``'s stacks to PROFILER_DIR and return the file name."""
+    directory = Path(settings.PROFILER_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = profile_name(request, seconds)
+    (directory / name).write_text(sampler.collapsed())
+    rotate_profiles(directory, settings.PROFILER_MAX_FILES)
+    return name
+
+
+def rotate_profiles(directory, keep):
+    """Delete all but the newest ``keep`` profiles in ``directory``."""
+    # Names start with their timestamp, so they sort oldest first
+    profiles = sorted(directory.glob(f"*{SUFFIX}"))
+    for path in profiles[: max(len(profiles) - keep, 0)]:
+        path.unlink(missing_ok=True)
+
+
+def read_profile(path):
+    """Parse a collapsed-stack file into a Counter of stacks."""
+    stacks = Counter()
+    for line in Path(path).read_text().splitlines():
+        stack, _, count = line.rpartition(" ")
+        if stack and count.isdigit():
+            stacks[stack] += int(count)
+    return stacks
+
+
+def rank_functions(stacks):
+    """
+    Count the samples each function was running in (self) and on the stack
+    for (total), from a Counter of collapsed stacks. Recursive functions
+    count once per sample."""
+    own = Counter()
+    total = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return own, total
@@ -0,0 +1,52 @@
+""" Renderers for the core app. """
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+from rest_framework_json_api import renderers as json_api_renderers
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+
+class FastJSONEncodingRenderer(renderers.JSONRenderer):
+    """
+    DRF's JSON renderer with the final encoding step done by orjson when it is
+    installed. orjson encodes dicts, lists, UUIDs and datetimes natively;
+    anything else goes through DRF's encoder. Indented or non-compact output,
+    and values orjson rejects (such as integers beyond 64 bits), fall back to
+    the stdlib encoder.
+    """
+
+    orjson_options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            orjson is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=encoders.JSONEncoder().default,
+                option=self.orjson_options,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Match DRF, which escapes these so the output is valid JavaScript
+        return ret.replace("\u2028".encode(), b"\\u2028").replace(
+            "\u2029".encode(), b"\\u2029"
+        )
+
+
+class JSONRenderer(json_api_renderers.JSONRenderer, FastJSONEncodingRenderer):
+    """
+    The JSON:API renderer, producing the same documents, encoded by
+    ``FastJSONEncodingRenderer``.
+    """
@@ -0,0 +1,101 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary, the ``default`` database. Reads go to a
+replica from ``DATABASE_REPLICAS`` only while the current request allows it,
+which ReplicaRoutingMiddleware decides: safe-method requests do, unless the
+client wrote within the last ``DATABASE_REPLICA_PIN_SECONDS`` and might not
+see its write on a lagging replica yet. Code running outside a request, such
+as management commands, reads from the primary.
+"""
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import salted_hmac
+
+# Whether reads of the current request may go to replicas
+_replica_reads = ContextVar("replica_reads", default=False)
+# The replica they go to, so that every query of a request, such as the
+# validators and the document of a conditional GET, sees the same state
+_replica = ContextVar("replica", default=None)
+
+
+def read_from_replicas(allowed):
+    """
+    Let the current request's reads go to replicas, or keep them off. One
+    replica is picked for the whole request."""
+    _replica_reads.set(allowed)
+    _replica.set(
+        random.choice(settings.DATABASE_REPLICAS)
+        if allowed and settings.DATABASE_REPLICAS
+        else None
+    )
+
+
+def reading_from_replicas():
+    return _replica_reads.get()
+
+
+def client_key(request):
+    """
+    Identify the client behind ``request`` by its credentials, the bearer
+    token or the session cookie, or return None for anonymous clients."""
+    credentials = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not credentials:
+        return None
+    return "db-pin:" + salted_hmac("core.routers.client_key", credentials).hexdigest()
+
+
+def pin_to_primary(request):
+    """Send the reads of ``request``'s client to the primary for a while."""
+    key = client_key(request)
+    if key is not None:
+        caches[settings.DATABASE_REPLICA_PIN_CACHE].set(
+            key, True, settings.DATABASE_REPLICA_PIN_SECONDS
+        )
+
+
+def is_pinned_to_primary(request):
+    key = client_key(request)
+    return key is not None and bool(
+        caches[settings.DATABASE_REPLICA_PIN_CACHE].get(key)
+    )
+
+
+async def apin_to_primary(request):
+    """Async version of ``pin_to_primary()``."""
+    key = client_key(request)
+    if key is not None:
+        await caches[settings.DATABASE_REPLICA_PIN_CACHE].aset(
+            key, True, settings.DATABASE_REPLICA_PIN_SECONDS
+        )
+
+
+async def ais_pinned_to_primary(request):
+    """Async version of ``is_pinned_to_primary()``."""
+    key = client_key(request)
+    return key is not None and bool(
+        await caches[settings.DATABASE_REPLICA_PIN_CACHE].aget(key)
+    )
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _replica.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so objects read from any of them
+        # may be related
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,79 @@
+""" This module provides a shared S3 client and cached signed URLs. """
+
+import threading
+from functools import partial
+from uuid import uuid4
+
+import boto3
+from django.conf import settings
+
+from utils.cache import TTLCache
+
+from .metrics import timed
+
+_client = None
+_client_lock = threading.Lock()
+
+# Signed URLs are reused until they have this fraction of their lifetime left,
+# so a cached URL handed to a client is always valid for a good while longer.
+SIGNED_URL_REFRESH_FRACTION = 0.5
+
+signed_url_cache = TTLCache(
+    max_size=settings.S3_SIGNED_URL_CACHE_SIZE,
+    ttl=settings.S3_SIGNED_URL_EXPIRES * (1 - SIGNED_URL_REFRESH_FRACTION),
+)
+
+
+def get_s3_client():
+    """
+    Return the process-wide S3 client, creating it on first use.
+
+    boto3 clients are thread-safe once built, but building one is not, so
+    construction happens under a lock.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = boto3.client(
+                    "s3",
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_REGION,
+                )
+    return _client
+
+
+def generate_signed_get_url(cloud_id):
+    """
+    Return a presigned GET URL for ``cloud_id``, served from
+    ``signed_url_cache`` when a fresh enough one exists.
+    """
+    return signed_url_cache.get_or_set(cloud_id, partial(sign_get_url, cloud_id))
+
+
+def sign_get_url(cloud_id):
+    with timed("s3", "generate_presigned_url"):
+        return get_s3_client().generate_presigned_url(
+            "get_object",
+            Params={"Bucket": settings.AWS_STORAGE_BUCKET_NAME, "Key": cloud_id},
+            ExpiresIn=settings.S3_SIGNED_URL_EXPIRES,
+        )
+
+
+def generate_presigned_upload(file_name):
+    """
+    Return a new cloud id for ``file_name`` and a presigned POST for uploading
+    it, as ``(cloud_id, signed_post)``.
+    """
+    file_name_without_extension = file_name.split(".")[0]
+    cloud_id = f"event_attachments/{file_name_without_extension}_{uuid4()}"
+    with timed("s3", "generate_presigned_post"):
+        signed_post = get_s3_client().generate_presigned_post(
+            settings.AWS_STORAGE_BUCKET_NAME,
+            cloud_id,
+            Fields=None,
+            Conditions=None,
+            ExpiresIn=3600,  # URL expiration time in seconds
+        )
+    return cloud_id, signed_post
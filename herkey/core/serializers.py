@@ -1,11 +1,26 @@
 """ Serializers for the core app. """
 
-import boto3
-from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from . import models
+from .authentication import USER_CLAIMS
+from .event_cache import invalidate_event
+from .s3 import generate_signed_get_url
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    A ModelSerializer that takes an additional ``fields`` argument limiting
+    which fields it renders."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,7 +35,7 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
 
-class EventParticipantsSerializer(serializers.ModelSerializer):
+class EventParticipantsSerializer(DynamicFieldsModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
@@ -36,6 +51,7 @@ class EventParticipantsSerializer(serializers.ModelSerializer):
             "created",
             "modified",
         )
+        read_only_fields = ("id",)
 
 
 class EventAttachmentSerializer(serializers.ModelSerializer):
@@ -52,36 +68,13 @@ class EventAttachmentSerializer(serializers.ModelSerializer):
             "modified",
         )
 
-    def create(self, validated_data):
-        event_id = validated_data.pop("event_id")
-        event = models.Event.objects.get(id=event_id)
-        attachment = models.EventAttachment.objects.create(
-            event=event, **validated_data
-        )
-        return attachment
-
     def get_signed_url(self, obj):
         """ "
         Generate a signed URL for the attachment."""
         if not obj.attachment_cloud_id:
             return None
-
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_REGION,
-        )
         try:
-            signed_url = s3_client.generate_presigned_url(
-                "get_object",
-                Params={
-                    "Bucket": settings.AWS_STORAGE_BUCKET_NAME,
-                    "Key": obj.attachment_cloud_id,
-                },
-                ExpiresIn=7200,  # URL expiration time in seconds
-            )
-            return signed_url
+            return generate_signed_get_url(obj.attachment_cloud_id)
         except Exception as e:
             return str(e)
 
@@ -91,9 +84,48 @@ class EventAttachmentSerializer(serializers.ModelSerializer):
         return representation
 
 
-class EventSerializer(serializers.ModelSerializer):
-    participants = EventParticipantsSerializer(many=True, read_only=True)
-    attachments = EventAttachmentSerializer(many=True, read_only=True)
+class EventAttachmentListSerializer(serializers.ListSerializer):
+    """
+    Registers many attachments of one event with a single INSERT."""
+
+    def validate(self, attrs):
+        event = self.context["event"]
+        banners = sum(1 for item in attrs if item.get("type") == "BANNER")
+        if banners > 1:
+            raise serializers.ValidationError("Only one banner is allowed per event.")
+        if banners and event.attachments.filter(type="BANNER").exists():
+            raise serializers.ValidationError("This event already has a banner.")
+        return attrs
+
+    def create(self, validated_data):
+        attachments = [models.EventAttachment(**item) for item in validated_data]
+        with transaction.atomic():
+            attachments = models.EventAttachment.objects.bulk_create(attachments)
+            # bulk_create sends no post_save, so update the counter here
+            models.Event.objects.filter(pk=self.context["event"].pk).adjust_counts(
+                attachments=len(attachments)
+            )
+            invalidate_event(self.context["event"].pk)
+        return attachments
+
+
+class EventAttachmentBulkSerializer(serializers.ModelSerializer):
+    """
+    One item of a bulk registration; the event is shared by the whole batch."""
+
+    class Meta:
+        model = models.EventAttachment
+        fields = (
+            "attachment_cloud_id",
+            "attachment_name",
+            "type",
+        )
+        list_serializer_class = EventAttachmentListSerializer
+
+
+class EventSummarySerializer(DynamicFieldsModelSerializer):
+    """
+    An event with participant and attachment counts instead of nested lists."""
 
     class Meta:
         model = models.Event
@@ -108,6 +140,18 @@ class EventSerializer(serializers.ModelSerializer):
             "modified",
             "active",
             "stream_session_id",
+            "participant_count",
+            "host_count",
+            "attachment_count",
+        )
+
+
+class EventSerializer(EventSummarySerializer):
+    participants = EventParticipantsSerializer(many=True, read_only=True)
+    attachments = EventAttachmentSerializer(many=True, read_only=True)
+
+    class Meta(EventSummarySerializer.Meta):
+        fields = EventSummarySerializer.Meta.fields + (
             "participants",
             "attachments",
         )
@@ -117,6 +161,9 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
+        # Lets StatelessJWTAuthentication build the user without a query
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
         return token
 
     def validate(self, attrs):
@@ -0,0 +1,79 @@
+"""
+Signal handlers keeping Event counters in step with their child rows and
+dropping cached event documents when an event or its children change,
+ending each request's replica reads and instrumenting database connections.
+"""
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .event_cache import invalidate_event
+from .metrics import instrument_connection
+from .models import Event, EventAttachment, EventParticipant
+from .routers import read_from_replicas
+
+
+def _deleted_with_event(origin):
+    """Whether a delete cascaded from an Event, making counter updates moot."""
+    return isinstance(origin, Event) or getattr(origin, "model", None) is Event
+
+
+@receiver(post_save, sender=EventParticipant)
+def participant_saved(sender, instance, created, update_fields=None, **kwargs):
+    events = Event.objects.filter(pk=instance.event_id)
+    if created:
+        events.adjust_counts(participants=1, hosts=int(instance.type == "HOST"))
+    elif update_fields is None or "type" in update_fields:
+        # The type may have changed and the old value is not known here
+        events.recount()
+
+
+@receiver(post_delete, sender=EventParticipant)
+def participant_deleted(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_event(origin):
+        Event.objects.filter(pk=instance.event_id).adjust_counts(
+            participants=-1, hosts=-int(instance.type == "HOST")
+        )
+
+
+@receiver(post_save, sender=EventAttachment)
+def attachment_saved(sender, instance, created, **kwargs):
+    if created:
+        Event.objects.filter(pk=instance.event_id).adjust_counts(attachments=1)
+
+
+@receiver(post_delete, sender=EventAttachment)
+def attachment_deleted(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_event(origin):
+        Event.objects.filter(pk=instance.event_id).adjust_counts(attachments=-1)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, **kwargs):
+    invalidate_event(instance.pk)
+
+
+@receiver(post_save, sender=EventParticipant)
+@receiver(post_delete, sender=EventParticipant)
+@receiver(post_save, sender=EventAttachment)
+@receiver(post_delete, sender=EventAttachment)
+def event_child_changed(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_event(origin):
+        invalidate_event(instance.event_id)
+
+
+@receiver(request_finished)
+def request_done(sender, **kwargs):
+    # Sent once a response, streamed ones included, has been sent. The
+    # thread may go on to run code that must read from the primary.
+    read_from_replicas(False)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    if settings.METRICS_ENABLED:
+        instrument_connection(connection)
@@ -1,3 +1,1851 @@
-from django.test import TestCase
+""" Tests for the core app. """
 
-# Create your tests here.
+import asyncio
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from base64 import b64decode, b64encode
+from datetime import timedelta
+from operator import itemgetter
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlencode, urlsplit
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished
+from django.db import connection, router
+from django.db.models import F
+from django.db.utils import load_backend
+from django.http import HttpResponse
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+)
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from psycopg2 import extensions
+from rest_framework.test import APIClient, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_json_api.renderers import JSONRenderer as JsonApiRenderer
+
+from utils.cache import TTLCache
+from utils.pool import ConnectionPool, PoolTimeout
+from utils.profiler import StackSampler, collapse, frame_name
+
+from .agora import get_agora_token, token_cache
+from . import async_views, event_cache, metrics, routers
+from .authentication import StatelessJWTAuthentication, TokenUser
+from .conditional import signed_url_window_start
+from .db.pooled_postgresql.base import pool_stats
+from .management.commands.bench_registration import (
+    register_on_conflict,
+    run_concurrently,
+)
+from .management.commands.serve import Server, mark_metrics_dead
+from .middleware import MetricsMiddleware, ReplicaRoutingMiddleware
+from .models import Event, EventParticipant, EventAttachment
+from .pagination import keyset_filter
+from .premint import premint_event_tokens
+from .profiling import rank_functions
+from .renderers import JSONRenderer
+from .s3 import get_s3_client, signed_url_cache
+from .views import create_agora_token, event_cache_stats
+from .serializers import (
+    CustomTokenObtainPairSerializer,
+    EventAttachmentSerializer,
+    EventParticipantsSerializer,
+    EventSummarySerializer,
+)
+
+_sequence = itertools.count()
+
+
+def post_json(client, url, data):
+    """POST ``data`` as plain JSON, which is what the views parse."""
+    return client.generic(
+        "POST", url, json.dumps(data), content_type="application/json"
+    )
+
+
+def seed_events(count, participants_per_event=3, attachments_per_event=2):
+    """Create ``count`` events, each with its own participants and attachments."""
+    events = []
+    for _ in range(count):
+        index = next(_sequence)
+        event = Event.objects.create(title=f"Event {index}")
+        for position in range(participants_per_event):
+            user = User.objects.create(username=f"user-{index}-{position}")
+            EventParticipant.objects.create(event=event, user=user)
+        for position in range(attachments_per_event):
+            EventAttachment.objects.create(
+                event=event, attachment_cloud_id=f"event_attachments/{index}_{position}"
+            )
+        events.append(event)
+    return events
+
+
+class QueryCountTestCase(TestCase):
+    """Endpoints must run a fixed number of queries regardless of row count."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="viewer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertQueryCountIsConstant(self, url_for, grow):
+        """
+        Call the endpoint before and after ``grow`` adds rows and assert the
+        query count did not change."""
+        before = self.count_queries(url_for())
+        grow()
+        after = self.count_queries(url_for())
+        self.assertEqual(before, after)
+
+    def test_event_list(self):
+        seed_events(2)
+        self.assertQueryCountIsConstant(
+            lambda: "/api/events/", lambda: seed_events(5)
+        )
+
+    def test_event_retrieve(self):
+        event = seed_events(1, participants_per_event=1, attachments_per_event=1)[0]
+
+        def grow():
+            for position in range(5):
+                user = User.objects.create(username=f"extra-{position}")
+                EventParticipant.objects.create(event=event, user=user)
+                EventAttachment.objects.create(
+                    event=event, attachment_cloud_id=f"extra/{position}"
+                )
+
+        self.assertQueryCountIsConstant(lambda: f"/api/events/{event.pk}/", grow)
+
+    def test_event_get_participants(self):
+        event = seed_events(1, participants_per_event=1)[0]
+
+        def grow():
+            for position in range(5):
+                user = User.objects.create(username=f"extra-{position}")
+                EventParticipant.objects.create(event=event, user=user)
+
+        self.assertQueryCountIsConstant(
+            lambda: f"/api/events/{event.pk}/get_participants/", grow
+        )
+
+    def test_event_participant_list(self):
+        seed_events(2)
+        self.assertQueryCountIsConstant(
+            lambda: "/api/event-participants/", lambda: seed_events(5)
+        )
+
+
+class CursorPaginationTestCase(TestCase):
+    """List endpoints return keyset pages linked through ``links.next``."""
+
+    def setUp(self):
+        self.user = User.objects.create(username="viewer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def collect_pages(self, url):
+        """Follow ``links.next`` from ``url`` and return every resource id seen."""
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            document = response.json()
+            self.assertLessEqual(len(document["data"]), 2)
+            ids.extend(resource["id"] for resource in document["data"])
+            url = document["links"]["next"]
+        return ids
+
+    def test_event_pages_cover_every_event_once(self):
+        events = seed_events(5, participants_per_event=1, attachments_per_event=0)
+        ids = self.collect_pages("/api/events/?page[size]=2")
+        expected = [str(event.pk) for event in reversed(events)]
+        self.assertEqual(ids, expected)
+
+    def test_participant_pages_cover_every_participant_once(self):
+        seed_events(3, participants_per_event=2, attachments_per_event=0)
+        ids = self.collect_pages("/api/event-participants/?page[size]=2")
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+
+    def test_pages_within_equal_timestamps_are_keyed_on_id(self):
+        events = seed_events(5, participants_per_event=0, attachments_per_event=0)
+        Event.objects.update(created=timezone.now())
+        expected = [str(pk) for pk in sorted((e.pk for e in events), reverse=True)]
+        self.assertEqual(self.collect_pages("/api/events/?page[size]=2"), expected)
+
+        response = self.client.get("/api/events/?page[size]=2")
+        last = self.client.get(response.json()["links"]["next"]).json()
+        cursor = parse_qs(urlsplit(last["links"]["next"]).query)["page[cursor]"][0]
+        # Cursors name a position, not an offset from one
+        self.assertNotIn("o=", b64decode(cursor).decode())
+        back = self.client.get(last["links"]["prev"]).json()
+        self.assertEqual([r["id"] for r in back["data"]], expected[:2])
+
+    def test_malformed_cursor_is_not_found(self):
+        for position in ('["not a date", "x"]', '["x"]', "null"):
+            cursor = b64encode(urlencode({"p": position}).encode()).decode()
+            response = self.client.get(
+                f"/api/events/?{urlencode({'page[cursor]': cursor})}"
+            )
+            self.assertEqual(response.status_code, 404)
+
+    def test_user_pages_cover_every_user_once(self):
+        seed_events(2, participants_per_event=2, attachments_per_event=0)
+        ids = self.collect_pages("/api/users/?page[size]=2")
+        expected = User.objects.order_by("pk").values_list("pk", flat=True)
+        self.assertEqual(ids, [str(pk) for pk in expected])
+
+
+class EventFilterTestCase(TestCase):
+    collect_pages = CursorPaginationTestCase.collect_pages
+
+    def setUp(self):
+        self.user = User.objects.create(username="filterer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now()
+        self.events = seed_events(6, participants_per_event=0, attachments_per_event=0)
+        for position, event in enumerate(self.events):
+            event.type = ("SCHEDULED", "LIVE")[position % 2]
+            event.scheduled_date = self.now + timedelta(days=3 * position - 3)
+            event.active = position != 2
+            event.save()
+
+    def event_ids(self, **params):
+        return self.collect_pages(f"/api/events/?page[size]=2&{urlencode(params)}")
+
+    def test_upcoming_events_in_date_order(self):
+        ids = self.event_ids(
+            **{
+                "filter[scheduled_date.gte]": self.now.isoformat(),
+                "filter[scheduled_date.lt]": (self.now + timedelta(days=7)).isoformat(),
+                "sort": "scheduled_date",
+            }
+        )
+        self.assertEqual(ids, [str(event.pk) for event in self.events[1:4]])
+
+    def test_type_and_active(self):
+        ids = self.event_ids(**{"filter[type]": "LIVE", "filter[active]": "true"})
+        expected = [self.events[5], self.events[3], self.events[1]]
+        self.assertEqual(ids, [str(event.pk) for event in expected])
+        ids = self.event_ids(**{"filter[active]": "false", "summary": "true"})
+        self.assertEqual(ids, [str(self.events[2].pk)])
+
+    def test_sorting_by_a_date_puts_events_without_one_last(self):
+        undated = seed_events(3, participants_per_event=0, attachments_per_event=0)
+        undated = [str(pk) for pk in sorted(event.pk for event in undated)]
+        dated = [str(event.pk) for event in self.events]
+        ids = self.event_ids(sort="scheduled_date")
+        self.assertEqual(ids, dated + undated)
+        ids = self.event_ids(sort="-scheduled_date")
+        self.assertEqual(ids, dated[::-1] + undated[::-1])
+
+        # Walking back from the last page crosses the NULLs the other way
+        url = "/api/events/?page[size]=2&sort=-scheduled_date"
+        while True:
+            document = self.client.get(url).json()
+            if not document["links"]["next"]:
+                break
+            url = document["links"]["next"]
+        backwards = []
+        while url:
+            document = self.client.get(url).json()
+            backwards[:0] = [resource["id"] for resource in document["data"]]
+            url = document["links"]["prev"]
+        self.assertEqual(backwards, ids)
+
+    def test_rejects_unknown_parameters(self):
+        for params in (
+            {"sort": "title"},
+            {"filter[title]": "x"},
+            {"title": "x"},
+        ):
+            response = self.client.get(f"/api/events/?{urlencode(params)}")
+            self.assertEqual(response.status_code, 400, params)
+
+
+class TTLCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = TTLCache(max_size=2, ttl=10, clock=lambda: self.now)
+
+    def test_entries_expire(self):
+        self.cache.set("a", 1)
+        self.now = 9
+        self.assertEqual(self.cache.get("a"), 1)
+        self.now = 10
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(len(self.cache), 2)
+
+
+class SignedUrlTestCase(SimpleTestCase):
+    def setUp(self):
+        signed_url_cache.clear()
+
+    def test_client_is_shared(self):
+        self.assertIs(get_s3_client(), get_s3_client())
+
+    def test_signed_urls_are_cached_per_cloud_id(self):
+        event = Event(title="Event")
+        first = EventAttachment(event=event, attachment_cloud_id="a/1")
+        second = EventAttachment(event=event, attachment_cloud_id="a/1")
+        other = EventAttachment(event=event, attachment_cloud_id="a/2")
+        urls = [
+            item["signed_url"]
+            for item in EventAttachmentSerializer(
+                [first, second, other], many=True
+            ).data
+        ]
+        self.assertEqual(urls[0], urls[1])
+        self.assertNotEqual(urls[0], urls[2])
+        self.assertEqual(signed_url_cache.stats()["hits"], 1)
+
+
+class BulkAttachmentTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="uploader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.event = Event.objects.create(title="Gallery")
+
+    def test_batch_pre_signed_urls(self):
+        response = post_json(
+            self.client,
+            "/api/event-attachments/get_pre_signed_urls/",
+            {"file_names": ["one.png", "two.png"]},
+        )
+        self.assertEqual(response.status_code, 200)
+        uploads = response.json()["data"]["uploads"]
+        self.assertEqual(
+            [upload["file_name"] for upload in uploads], ["one.png", "two.png"]
+        )
+        self.assertTrue(uploads[0]["cloud_id"].startswith("event_attachments/one_"))
+        self.assertIn("url", uploads[0]["signed_url"])
+
+    def test_batch_pre_signed_urls_requires_file_names(self):
+        response = post_json(
+            self.client, "/api/event-attachments/get_pre_signed_urls/", {}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_registration_uses_one_insert(self):
+        attachments = [
+            {"attachment_cloud_id": f"event_attachments/{index}", "type": "EVENT_IMAGE"}
+            for index in range(10)
+        ]
+        attachments[0]["type"] = "BANNER"
+        with CaptureQueriesContext(connection) as context:
+            response = post_json(
+                self.client,
+                "/api/event-attachments/bulk/",
+                {"event": str(self.event.pk), "attachments": attachments},
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.event.attachments.count(), 10)
+        inserts = [
+            query
+            for query in context.captured_queries
+            if query["sql"].startswith("INSERT")
+        ]
+        self.assertEqual(len(inserts), 1)
+
+    def test_bulk_registration_rejects_second_banner(self):
+        EventAttachment.objects.create(event=self.event, type="BANNER")
+        response = post_json(
+            self.client,
+            "/api/event-attachments/bulk/",
+            {
+                "event": str(self.event.pk),
+                "attachments": [{"attachment_cloud_id": "a", "type": "BANNER"}],
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.event.attachments.count(), 1)
+
+    def test_bulk_registration_rejects_two_banners_in_one_batch(self):
+        response = post_json(
+            self.client,
+            "/api/event-attachments/bulk/",
+            {
+                "event": str(self.event.pk),
+                "attachments": [
+                    {"attachment_cloud_id": "a", "type": "BANNER"},
+                    {"attachment_cloud_id": "b", "type": "BANNER"},
+                ],
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.event.attachments.exists())
+
+    def test_single_registration(self):
+        response = post_json(
+            self.client,
+            "/api/event-attachments/",
+            {"event": str(self.event.pk), "attachment_cloud_id": "a", "type": "BANNER"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.event.attachments.get().attachment_cloud_id, "a")
+
+
+class AgoraTokenCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.now = 0
+        token_cache.clear()
+        token_cache.clock = lambda: self.now
+
+    def tearDown(self):
+        token_cache.clock = time.monotonic
+
+    def test_token_is_reused_while_fresh(self):
+        first = get_agora_token("rtc", "channel", 1, "host", expire_time=100)
+        self.now = 49
+        self.assertIs(
+            get_agora_token("rtc", "channel", 1, "host", expire_time=100), first
+        )
+        self.assertEqual(token_cache.stats()["hits"], 1)
+        self.now = 50
+        self.assertIsNot(
+            get_agora_token("rtc", "channel", 1, "host", expire_time=100), first
+        )
+
+    def test_key_includes_channel_uid_role_and_kind(self):
+        token = get_agora_token("rtc", "channel", 1, "host")
+        self.assertIsNot(get_agora_token("rtm", "channel", 1, "host"), token)
+        self.assertIsNot(get_agora_token("rtc", "channel", 2, "host"), token)
+        self.assertIsNot(get_agora_token("rtc", "channel", 1, "audience"), token)
+        self.assertIsNot(get_agora_token("rtc", "other", 1, "host"), token)
+        self.assertEqual(token_cache.stats()["misses"], 5)
+
+
+class PremintTokensTestCase(TestCase):
+    def setUp(self):
+        self.event = seed_events(1, participants_per_event=5)[0]
+        self.host = User.objects.create(username="host")
+        EventParticipant.objects.create(event=self.event, user=self.host, type="HOST")
+        self.client = APIClient()
+
+    def test_premint_stores_tokens_for_every_participant(self):
+        result = premint_event_tokens(self.event, workers=2, chunk_size=2)
+        self.assertEqual(result["participants"], 6)
+        self.assertEqual(result["tokens"], 18)
+        host = EventParticipant.objects.get(user=self.host)
+        self.assertEqual(host.agora_tokens["role"], "host")
+        self.assertFalse(
+            EventParticipant.objects.filter(agora_tokens__isnull=True).exists()
+        )
+
+    def test_agora_token_endpoint_serves_preminted_tokens(self):
+        premint_event_tokens(self.event, workers=1)
+        stored = EventParticipant.objects.get(user=self.host).agora_tokens
+        self.client.force_authenticate(self.host)
+        response = post_json(
+            self.client, "/api/agora-token/", {"event_id": str(self.event.pk)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["data"]["rtm_token"]["token"], stored["rtm_token"]["token"]
+        )
+
+    def test_premint_command(self):
+        out = io.StringIO()
+        call_command("premint_agora_tokens", str(self.event.pk), stdout=out)
+        self.assertIn("for 6 participants", out.getvalue())
+        self.assertFalse(
+            EventParticipant.objects.filter(agora_tokens__isnull=True).exists()
+        )
+
+    def test_mint_tokens_endpoint_is_host_only(self):
+        url = f"/api/events/{self.event.pk}/mint_tokens/"
+        audience = self.event.participants.filter(type="PARTICIPANT").first()
+        self.client.force_authenticate(audience.user)
+        self.assertEqual(self.client.post(url).status_code, 403)
+        self.client.force_authenticate(self.host)
+        # The endpoint never forks a process pool from the web worker
+        with self.settings(
+            AGORA_PREMINT_WORKERS=4, AGORA_PREMINT_CHUNK_SIZE=2
+        ), mock.patch("core.premint.ProcessPoolExecutor") as pool:
+            response = self.client.post(url)
+        pool.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["participants"], 6)
+
+    def test_participant_reads_skip_stored_tokens(self):
+        premint_event_tokens(self.event, workers=1)
+        self.client.force_authenticate(self.host)
+        urls = [
+            "/api/event-participants/",
+            "/api/event-participants/?stream=true",
+            f"/api/event-participants/{self.event.participants.first().pk}/",
+            f"/api/events/{self.event.pk}/get_participants/",
+            f"/api/events/{self.event.pk}/",
+        ]
+        for url in urls:
+            with self.subTest(url=url), CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+                sql = " ".join(query["sql"] for query in context.captured_queries)
+                self.assertNotIn("agora_tokens", sql)
+
+
+class ParticipantRegistrationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="joiner")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.event = Event.objects.create(title="Live")
+
+    def register(self, event_id):
+        return post_json(
+            self.client, "/api/event-participants/", {"event": str(event_id)}
+        )
+
+    def assertInsertsWithoutReads(self, context):
+        statements = [query["sql"].split()[0] for query in context.captured_queries]
+        self.assertNotIn("SELECT", statements)
+        self.assertEqual(statements.count("INSERT"), 1)
+
+    def test_registration_is_one_insert(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.register(self.event.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertInsertsWithoutReads(context)
+        user = response.json()["data"]["attributes"]["user"]
+        self.assertEqual(user["id"], self.user.pk)
+
+    def test_second_registration_is_rejected_without_a_read(self):
+        self.register(self.event.pk)
+        with CaptureQueriesContext(connection) as context:
+            response = self.register(self.event.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertInsertsWithoutReads(context)
+        self.assertEqual(self.event.participants.count(), 1)
+
+    def test_unknown_event_is_not_found(self):
+        self.assertEqual(self.register("not-a-uuid").status_code, 404)
+        self.assertEqual(self.register(uuid4()).status_code, 404)
+        self.assertFalse(EventParticipant.objects.exists())
+
+    def test_id_is_not_writable(self):
+        chosen = uuid4()
+        response = post_json(
+            self.client,
+            "/api/event-participants/",
+            {"event": str(self.event.pk), "id": str(chosen)},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()["data"]["id"], str(chosen))
+
+
+class ParticipantRoutesTestCase(TestCase):
+    def setUp(self):
+        seed_events(2)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username="browser"))
+        self.participant = EventParticipant.objects.order_by("created").first()
+
+    def test_list_retrieve_and_destroy(self):
+        response = self.client.get("/api/event-participants/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"]), 6)
+        url = f"/api/event-participants/{self.participant.pk}/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["id"], str(self.participant.pk))
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_unknown_routes_are_not_found(self):
+        response = self.client.get("/api/event-participants/search/?filter[search]=a")
+        self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs concurrent Postgres sessions")
+class ConcurrentRegistrationTestCase(TransactionTestCase):
+    def test_concurrent_registrations_create_no_duplicates(self):
+        event = Event.objects.create(title="Launch")
+        users = User.objects.bulk_create(
+            [User(username=f"concurrent-{index}") for index in range(200)]
+        )
+        result = run_concurrently(register_on_conflict, event.id, users, threads=32)
+        self.assertEqual(result["created"], 200)
+        self.assertEqual(result["rejected"], 200)
+        self.assertEqual(result["errors"], 0)
+        self.assertEqual(event.participants.count(), 200)
+
+
+class ParticipantImportTestCase(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(title="Conference")
+        self.host = User.objects.create(username="organizer")
+        EventParticipant.objects.create(event=self.event, user=self.host, type="HOST")
+        self.users = User.objects.bulk_create(
+            [User(username=f"invitee-{index}") for index in range(5)]
+        )
+        self.url = f"/api/events/{self.event.pk}/import_participants/"
+        self.client = APIClient()
+        self.client.force_authenticate(self.host)
+
+    def test_import_user_ids_skips_existing_and_unknown(self):
+        EventParticipant.objects.create(event=self.event, user=self.users[0])
+        user_ids = [user.pk for user in self.users] + [self.host.pk, 999999]
+        response = post_json(self.client, self.url, {"user_ids": user_ids})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()["data"]
+        self.assertEqual(result["added"], 4)
+        self.assertEqual(result["unknown_user_ids"], [999999])
+        self.assertEqual(self.event.participants.count(), 6)
+
+    def test_concurrent_registrations_are_not_counted_as_added(self):
+        event = Event.objects.get(pk=self.event.pk)
+        EventParticipant.objects.register(event_id=event.pk, user=self.users[0])
+        added, unknown = EventParticipant.objects.bulk_register(
+            event, [user.pk for user in self.users[1:]]
+        )
+        self.assertEqual((added, unknown), (4, []))
+        self.assertEqual(event.participant_count, 6)
+
+    def test_import_csv_upload(self):
+        rows = "user_id\n" + "".join(f"{user.pk}\n" for user in self.users)
+        upload = SimpleUploadedFile("invites.csv", rows.encode(), "text/csv")
+        response = self.client.post(
+            self.url,
+            encode_multipart(BOUNDARY, {"file": upload}),
+            content_type=MULTIPART_CONTENT,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["added"], 5)
+
+    def test_import_is_host_only(self):
+        self.client.force_authenticate(self.users[0])
+        response = post_json(self.client, self.url, {"user_ids": [self.users[1].pk]})
+        self.assertEqual(response.status_code, 403)
+
+    def test_import_rejects_malformed_ids(self):
+        response = post_json(self.client, self.url, {"user_ids": ["abc"]})
+        self.assertEqual(response.status_code, 400)
+
+
+@skipUnless(connection.vendor == "postgresql", "COPY is PostgreSQL only")
+class LoadParticipantsCommandTestCase(TestCase):
+    def test_copy_import(self):
+        event = Event.objects.create(title="Town hall")
+        users = User.objects.bulk_create(
+            [User(username=f"copy-{index}") for index in range(10)]
+        )
+        EventParticipant.objects.create(event=event, user=users[0])
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as csv_file:
+            csv_file.write("user_id\n")
+            csv_file.writelines(f"{user.pk}\n" for user in users)
+            csv_file.write("999999\n")
+            csv_file.flush()
+            out = io.StringIO()
+            call_command(
+                "load_participants",
+                str(event.pk),
+                csv_file.name,
+                chunk_size=3,
+                stdout=out,
+            )
+        self.assertEqual(event.participants.count(), 10)
+        self.assertIn("9 participants added", out.getvalue())
+
+
+class EventCountersTestCase(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(title="Meetup")
+        self.users = User.objects.bulk_create(
+            [User(username=f"member-{index}") for index in range(3)]
+        )
+
+    def assertCounts(self, participants, hosts, attachments):
+        self.event.refresh_from_db()
+        self.assertEqual(
+            (
+                self.event.participant_count,
+                self.event.host_count,
+                self.event.attachment_count,
+            ),
+            (participants, hosts, attachments),
+        )
+
+    def test_counters_follow_creates_and_deletes(self):
+        host = EventParticipant.objects.create(
+            event=self.event, user=self.users[0], type="HOST"
+        )
+        EventParticipant.objects.register(event_id=self.event.pk, user=self.users[1])
+        attachment = EventAttachment.objects.create(event=self.event)
+        self.assertCounts(2, 1, 1)
+        host.type = "PARTICIPANT"
+        host.save()
+        self.assertCounts(2, 0, 1)
+        host.delete()
+        attachment.delete()
+        self.assertCounts(1, 0, 0)
+
+    def test_counters_follow_bulk_paths(self):
+        EventParticipant.objects.bulk_register(
+            self.event, [user.pk for user in self.users]
+        )
+        self.assertCounts(3, 0, 0)
+        self.event.participants.all().delete()
+        self.assertCounts(0, 0, 0)
+
+    def test_reconcile_repairs_drift(self):
+        EventParticipant.objects.create(event=self.event, user=self.users[0])
+        Event.objects.filter(pk=self.event.pk).update(participant_count=42)
+        self.assertEqual(Event.objects.drifted().count(), 1)
+        call_command("reconcile_event_counts", stdout=io.StringIO())
+        self.assertCounts(1, 0, 0)
+        self.assertFalse(Event.objects.drifted().exists())
+
+    def test_summary_list_returns_counts_without_nested_lists(self):
+        EventParticipant.objects.create(event=self.event, user=self.users[0])
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = client.get("/api/events/?summary=true")
+        attributes = response.json()["data"][0]["attributes"]
+        self.assertEqual(attributes["participant_count"], 1)
+        self.assertNotIn("participants", attributes)
+
+
+class SparseFieldsetTestCase(TestCase):
+    def setUp(self):
+        self.events = seed_events(2)
+        self.user = User.objects.create(username="reader")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_data(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)["data"]
+
+    def test_sparse_event_list_touches_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as context:
+            data = self.get_data("/api/events/?fields[event]=title,participant_count")
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn("description", context.captured_queries[0]["sql"])
+        self.assertEqual(data[0]["type"], "event")
+        self.assertEqual(set(data[0]["attributes"]), {"title", "participant_count"})
+
+    def test_sparse_fields_with_nested_list_prefetch_only_that_list(self):
+        with CaptureQueriesContext(connection) as context:
+            data = self.get_data("/api/events/?fields[event]=title,attachments")
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertEqual(set(data[0]["attributes"]), {"title", "attachments"})
+
+    def test_sparse_event_retrieve(self):
+        event = self.events[0]
+        data = self.get_data(f"/api/events/{event.pk}/?fields[event]=title")
+        self.assertEqual(data["attributes"], {"title": event.title})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/api/events/?fields[event]=nope")
+        self.assertEqual(response.status_code, 400)
+
+    def test_fast_path_matches_serializer_output(self):
+        event = Event.objects.get(pk=self.events[0].pk)
+        resource = next(
+            item
+            for item in self.get_data("/api/events/?summary=true")
+            if item["id"] == str(event.pk)
+        )
+        expected = json.loads(
+            json.dumps(EventSummarySerializer(event).data, default=str)
+        )
+        expected.pop("id")
+        self.assertEqual(resource["attributes"], expected)
+
+    def test_participant_summary_matches_serializer_output(self):
+        participant = EventParticipant.objects.first()
+        resource = next(
+            item
+            for item in self.get_data("/api/event-participants/?summary=true")
+            if item["id"] == str(participant.pk)
+        )
+        fields = [
+            name
+            for name in EventParticipantsSerializer.Meta.fields
+            if name not in ("id", "user", "event")
+        ]
+        expected = json.loads(
+            json.dumps(
+                EventParticipantsSerializer(participant, fields=fields).data,
+                default=str,
+            )
+        )
+        self.assertEqual(resource["attributes"], expected)
+        self.assertEqual(
+            resource["relationships"]["event"]["data"]["id"], str(participant.event_id)
+        )
+
+
+class JSONRendererTestCase(SimpleTestCase):
+    context = {"view": SimpleNamespace(resource_name=False)}
+
+    def assertRendersLikeJsonApi(self, data):
+        self.assertEqual(
+            JSONRenderer().render(data, renderer_context=dict(self.context)),
+            JsonApiRenderer().render(data, renderer_context=dict(self.context)),
+        )
+
+    def test_matches_json_api_renderer(self):
+        self.assertRendersLikeJsonApi(
+            {
+                "id": uuid4(),
+                "created": timezone.now(),
+                "title": "caf\u00e9 \u2028 line",
+                "nested": [{"count": 3, "ratio": 0.5, "flag": None}],
+            }
+        )
+
+    def test_falls_back_for_values_orjson_rejects(self):
+        self.assertRendersLikeJsonApi({"big": 2**70})
+
+    def test_falls_back_when_indented(self):
+        self.assertEqual(
+            JSONRenderer().render(
+                {"a": 1},
+                "application/vnd.api+json; indent=2",
+                renderer_context=dict(self.context),
+            ),
+            b'{\n  "a": 1\n}',
+        )
+
+
+class StreamingTestCase(TestCase):
+    def setUp(self):
+        self.event = seed_events(1, participants_per_event=7)[0]
+        seed_events(1, participants_per_event=3)
+        self.user = User.objects.create(username="streamer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stream(self, url):
+        with self.settings(STREAM_CHUNK_SIZE=2):
+            response = self.client.get(url)
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 3)
+        return json.loads(b"".join(chunks))["data"]
+
+    def test_streamed_participants_match_paginated_resources(self):
+        streamed = self.stream("/api/event-participants/?stream=true")
+        url = f"/api/event-participants/?page[size]={len(streamed)}"
+        paged = self.client.get(url)
+        self.assertEqual(streamed, json.loads(paged.content)["data"])
+
+    def test_streamed_summary_participants(self):
+        streamed = self.stream("/api/event-participants/?stream=true&summary=true")
+        self.assertEqual(len(streamed), 10)
+        self.assertNotIn("user", streamed[0]["attributes"])
+
+    def test_stream_event_participants(self):
+        streamed = self.stream(
+            f"/api/events/{self.event.pk}/get_participants/?stream=true"
+        )
+        self.assertEqual(
+            {resource["id"] for resource in streamed},
+            {str(pk) for pk in self.event.participants.values_list("pk", flat=True)},
+        )
+        self.assertEqual(streamed[0]["type"], "event-participant")
+
+    def test_event_participants_match_streamed_resources(self):
+        url = f"/api/events/{self.event.pk}/get_participants/"
+        streamed = self.stream(f"{url}?stream=true")
+        listed = json.loads(self.client.get(url).content)["data"]
+        self.assertEqual(
+            sorted(listed, key=itemgetter("id")), sorted(streamed, key=itemgetter("id"))
+        )
+        self.assertEqual(listed[0]["type"], "event-participant")
+        related = listed[0]["relationships"]["event"]["data"]
+        self.assertEqual(related, {"type": "event", "id": str(self.event.pk)})
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.event = seed_events(1, participants_per_event=2)[0]
+        self.user = User.objects.create(username="poller")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/events/{self.event.pk}/"
+
+    def revalidate(self, url, **headers):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, **headers)
+        return response, len(context.captured_queries)
+
+    def test_unchanged_event_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+        etag = response.headers["ETag"]
+        response, queries = self.revalidate(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+        # Only the validator query runs; nothing is serialized
+        self.assertEqual(queries, 1)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url).headers["Last-Modified"]
+        response, _ = self.revalidate(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_child_changes_change_the_etag(self):
+        etag = self.client.get(self.url).headers["ETag"]
+        participant = self.event.participants.first()
+        participant.active = False
+        participant.save()
+        response, _ = self.revalidate(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response.headers["ETag"]
+        self.event.attachments.first().delete()
+        response, _ = self.revalidate(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleting_a_child_moves_last_modified(self):
+        earlier = timezone.now() - timedelta(hours=1)
+        Event.objects.filter(pk=self.event.pk).update(modified=earlier)
+        EventParticipant.objects.filter(event=self.event).update(modified=earlier)
+        url = f"{self.url}get_participants/"
+        last_modified = self.client.get(url).headers["Last-Modified"]
+        self.event.participants.first().delete()
+        response, _ = self.revalidate(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)["data"]), 1)
+
+    def test_host_count_changes_the_etag(self):
+        etag = self.client.get(self.url).headers["ETag"]
+        Event.objects.filter(pk=self.event.pk).update(host_count=F("host_count") + 1)
+        response, _ = self.revalidate(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_signed_urls_change_the_etag_every_window(self):
+        window = signed_url_window_start()
+        self.assertEqual(signed_url_window_start(window + 1), window)
+        self.assertLess(signed_url_window_start(window - 1), window)
+
+    def test_get_participants(self):
+        url = f"{self.url}get_participants/"
+        etag = self.client.get(url).headers["ETag"]
+        response, _ = self.revalidate(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        user = User.objects.create(username="latecomer")
+        EventParticipant.objects.create(event=self.event, user=user)
+        response, _ = self.revalidate(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)["data"]), 3)
+
+    def test_missing_event(self):
+        response = self.client.get(f"/api/events/{uuid4()}/")
+        self.assertEqual(response.status_code, 404)
+
+
+class EventCacheTestCase(TestCase):
+    def setUp(self):
+        event_cache.get_cache().clear()
+        event_cache.stats.reset()
+        self.event = seed_events(1, participants_per_event=2)[0]
+        self.user = User.objects.create(username="watcher")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/events/{self.event.pk}/"
+
+    def get(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(context.captured_queries)
+
+    def test_repeat_retrieve_is_served_from_cache(self):
+        first, _ = self.get()
+        second, queries = self.get()
+        self.assertEqual(first, second)
+        self.assertEqual(queries, 1)
+        stats = event_cache.stats.as_dict()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["rebuilds"], 1)
+
+    def test_variants_are_cached_separately(self):
+        full, _ = self.get()
+        summary = json.loads(self.client.get(f"{self.url}?summary=true").content)
+        self.assertIn("participants", full["data"]["attributes"])
+        self.assertNotIn("participants", summary["data"]["attributes"])
+
+    def test_child_changes_invalidate(self):
+        self.get()
+        participant = self.event.participants.first()
+        participant.type = "HOST"
+        participant.save()
+        document, _ = self.get()
+        self.assertEqual(document["data"]["attributes"]["host_count"], 1)
+
+        EventParticipant.objects.register(
+            self.event.pk, User.objects.create(username="another")
+        )
+        document, _ = self.get()
+        self.assertEqual(document["data"]["attributes"]["participant_count"], 3)
+
+        self.event.attachments.first().delete()
+        document, _ = self.get()
+        self.assertEqual(len(document["data"]["attributes"]["attachments"]), 1)
+
+    def test_event_changes_invalidate(self):
+        self.get()
+        self.event.title = "Renamed"
+        self.event.save()
+        document, _ = self.get()
+        self.assertEqual(document["data"]["attributes"]["title"], "Renamed")
+
+    def test_changes_missed_by_invalidation_are_not_served(self):
+        # An update invalidated in another process leaves this process's
+        # cache alone, but moves the ETag the documents are keyed on
+        self.get()
+        Event.objects.filter(pk=self.event.pk).update(
+            title="Elsewhere", modified=timezone.now()
+        )
+        document, _ = self.get()
+        self.assertEqual(document["data"]["attributes"]["title"], "Elsewhere")
+
+    def test_replica_reads_do_not_fill_the_cache(self):
+        builds = []
+
+        def build():
+            builds.append(None)
+            return b"document"
+
+        routers.read_from_replicas(True)
+        self.addCleanup(routers.read_from_replicas, False)
+        for _ in range(2):
+            self.assertEqual(event_cache.get_or_build("lag", "v", build), b"document")
+        self.assertEqual(len(builds), 2)
+        routers.read_from_replicas(False)
+        event_cache.get_or_build("lag", "v", build)
+        routers.read_from_replicas(True)
+        event_cache.get_or_build("lag", "v", build)
+        self.assertEqual(len(builds), 3)
+
+    def test_concurrent_misses_rebuild_once(self):
+        builds = []
+        barrier = threading.Barrier(8)
+
+        def build():
+            builds.append(1)
+            time.sleep(0.1)
+            return b"document"
+
+        def fetch(results):
+            barrier.wait()
+            results.append(event_cache.get_or_build("herd", "variant", build))
+
+        results = []
+        threads = [threading.Thread(target=fetch, args=(results,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [b"document"] * 8)
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(event_cache.stats.as_dict()["waits"], 7)
+
+    def test_stats_endpoint_is_admin_only(self):
+        response = self.client.get("/api/event-cache/stats/")
+        self.assertEqual(response.status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.get()
+        response = self.client.get("/api/event-cache/stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["rebuilds"], 1)
+
+
+class QueryPlanTestCase(TestCase):
+    """The hot queries must be answered from indexes, not sequential scans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.events = seed_events(20, participants_per_event=5)
+        now = timezone.now()
+        for position, event in enumerate(cls.events):
+            event.type = Event.TYPE_CHOICES[position % 3][0]
+            event.scheduled_date = now + timedelta(hours=position)
+        Event.objects.bulk_update(cls.events, ["type", "scheduled_date"])
+        cls.participant = EventParticipant.objects.first()
+
+    def sequential_scans(self, queryset):
+        """Tables read by a sequential scan in the plan of ``queryset``."""
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("ANALYZE")
+                # Small tables are cheaper to scan; only fail if no index fits
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            return re.findall(r"Seq Scan on (\w+)", plan)
+        # SQLite reports "SCAN <table>" unless it walks an index
+        return re.findall(r"\bSCAN (\w+)$", plan, re.MULTILINE)
+
+    def assertUsesIndexes(self, queryset):
+        self.assertEqual(self.sequential_scans(queryset), [], queryset.explain())
+
+    def test_event_pages(self):
+        events = Event.objects.order_by("-created", "-id")
+        self.assertUsesIndexes(events[:50])
+        self.assertUsesIndexes(events.filter(created__lt=timezone.now())[:50])
+        position = [str(timezone.now()), str(uuid4())]
+        self.assertUsesIndexes(
+            events.filter(keyset_filter(("-created", "-id"), position))[:50]
+        )
+
+    def test_event_lifecycle(self):
+        now = timezone.now()
+        self.assertUsesIndexes(
+            Event.objects.filter(
+                type="SCHEDULED",
+                scheduled_date__range=(now, now + timedelta(days=1)),
+            )
+        )
+
+    def test_participant_lookups(self):
+        event_id = self.participant.event_id
+        user_id = self.participant.user_id
+        self.assertUsesIndexes(
+            EventParticipant.objects.filter(event_id=event_id, user_id=user_id)
+        )
+        self.assertUsesIndexes(
+            EventParticipant.objects.filter(user_id=user_id, event_id=event_id)
+        )
+        self.assertUsesIndexes(EventParticipant.objects.filter(user_id=user_id))
+        self.assertUsesIndexes(
+            EventParticipant.objects.filter(event_id=event_id).order_by(
+                "-created", "-id"
+            )[:50]
+        )
+        self.assertUsesIndexes(
+            EventParticipant.objects.order_by("-created", "-id")[:50]
+        )
+
+    def test_event_validators(self):
+        self.assertUsesIndexes(
+            Event.objects.filter(pk=self.participant.event_id)
+            .with_last_modified()
+            .values("last_modified", "participant_count", "attachment_count")
+        )
+
+    def test_event_filters(self):
+        now = timezone.now()
+        window = (now, now + timedelta(days=7))
+        self.assertUsesIndexes(
+            Event.objects.filter(active=True).order_by("-created", "-id")[:50]
+        )
+        self.assertUsesIndexes(
+            Event.objects.filter(scheduled_date__range=window).order_by(
+                "scheduled_date", "id"
+            )[:50]
+        )
+        self.assertUsesIndexes(
+            Event.objects.filter(end_date__range=window).order_by("end_date", "id")[
+                :50
+            ]
+        )
+        self.assertUsesIndexes(
+            Event.objects.filter(type__in=["LIVE", "SCHEDULED"]).order_by(
+                "scheduled_date", "id"
+            )[:50]
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "GIN index is PostgreSQL only")
+    def test_event_search(self):
+        self.assertUsesIndexes(Event.objects.search("even"))
+
+    def test_prefetched_children(self):
+        event_ids = [event.pk for event in self.events[:10]]
+        self.assertUsesIndexes(EventAttachment.objects.filter(event_id__in=event_ids))
+        self.assertUsesIndexes(
+            EventParticipant.objects.filter(event_id__in=event_ids).select_related(
+                "user"
+            )
+        )
+
+
+class EventSearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="searcher")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.meetup = Event.objects.create(title="Python meetup", type="LIVE")
+        self.patterns = Event.objects.create(
+            title="Pythonic patterns", description="Idioms for everyday code"
+        )
+        self.gardening = Event.objects.create(
+            title="Gardening basics", description="Keeping python snakes out"
+        )
+
+    def search(self, text, **params):
+        params["filter[search]"] = text
+        response = self.client.get(f"/api/events/search/?{urlencode(params)}")
+        self.assertEqual(response.status_code, 200)
+        return [resource["id"] for resource in response.json()["data"]]
+
+    def test_prefix_matches(self):
+        ids = self.search("pyth")
+        expected = [self.meetup, self.patterns, self.gardening]
+        self.assertEqual(set(ids), {str(event.pk) for event in expected})
+        if connection.vendor == "postgresql":
+            # Title matches outrank description matches
+            self.assertEqual(ids[-1], str(self.gardening.pk))
+        self.assertEqual(self.search("pyth meet"), [str(self.meetup.pk)])
+        self.assertEqual(self.search("?!"), [])
+
+    def test_combines_with_filters_and_fields(self):
+        ids = self.search("pyth", **{"filter[type]": "LIVE", "page[size]": "5"})
+        self.assertEqual(ids, [str(self.meetup.pk)])
+        response = self.client.get(
+            "/api/events/search/?filter[search]=garden&fields[event]=title"
+        )
+        resource = response.json()["data"][0]
+        self.assertEqual(resource["attributes"], {"title": "Gardening basics"})
+        response = self.client.get("/api/events/search/?filter[search]=garden")
+        self.assertIn("participants", response.json()["data"][0]["attributes"])
+
+    def test_list_filter_search(self):
+        response = self.client.get("/api/events/?filter[search]=garden")
+        ids = [resource["id"] for resource in response.json()["data"]]
+        self.assertEqual(ids, [str(self.gardening.pk)])
+
+    def test_search_is_required(self):
+        response = self.client.get("/api/events/search/")
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(connection.vendor == "postgresql", "search trigger is PostgreSQL only")
+    def test_vector_follows_title_changes(self):
+        self.gardening.title = "Composting"
+        self.gardening.save()
+        self.assertEqual(self.search("compost"), [str(self.gardening.pk)])
+        self.assertEqual(self.search("gardening"), [])
+
+
+class StatelessAuthenticationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="ada",
+            email="ada@example.com",
+            first_name="Ada",
+            last_name="Lovelace",
+        )
+        self.event = Event.objects.create(title="Live")
+        EventParticipant.objects.create(event=self.event, user=self.user)
+        self.client = APIClient()
+
+    def access_token(self):
+        return CustomTokenObtainPairSerializer.get_token(self.user).access_token
+
+    def authorize(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def post_stateless(self, view, url, data):
+        with mock.patch.object(
+            view.cls, "authentication_classes", [StatelessJWTAuthentication]
+        ), CaptureQueriesContext(connection) as context:
+            response = post_json(self.client, url, data)
+        return response, context.captured_queries
+
+    def test_token_embeds_user_claims(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.assertEqual(token["username"], "ada")
+        self.assertEqual(token["email"], "ada@example.com")
+        self.assertEqual(token["first_name"], "Ada")
+        self.assertEqual(token["last_name"], "Lovelace")
+        self.assertIs(token["is_staff"], False)
+        user = TokenUser(token)
+        self.assertEqual((user.pk, user.username), (self.user.pk, "ada"))
+        self.assertEqual(user.email, "ada@example.com")
+
+    def test_agora_token_runs_no_auth_queries(self):
+        self.authorize(self.access_token())
+        response, queries = self.post_stateless(
+            create_agora_token, "/api/agora-token/", {"event_id": str(self.event.pk)}
+        )
+        self.assertEqual(response.status_code, 200)
+        # Only the participant lookup
+        self.assertEqual(len(queries), 1)
+        self.assertIn("core_eventparticipant", queries[0]["sql"])
+
+    def test_tokens_without_claims_load_the_user(self):
+        self.authorize(AccessToken.for_user(self.user))
+        response, queries = self.post_stateless(
+            create_agora_token, "/api/agora-token/", {"event_id": str(self.event.pk)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+
+    def test_staff_claim(self):
+        self.user.is_staff = True
+        self.authorize(self.access_token())
+        with mock.patch.object(
+            event_cache_stats.cls,
+            "authentication_classes",
+            [StatelessJWTAuthentication],
+        ):
+            response = self.client.get("/api/event-cache/stats/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_register_as_token_user(self):
+        other = Event.objects.create(title="Other")
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        participant = EventParticipant.objects.register(other.pk, TokenUser(token))
+        self.assertEqual(participant.user_id, self.user.pk)
+        self.assertEqual(participant.user, self.user)
+
+
+class AsyncViewTestCase(TestCase):
+    def setUp(self):
+        self.event = seed_events(1, participants_per_event=2)[0]
+        self.user = User.objects.create(username="async")
+        EventParticipant.objects.create(event=self.event, user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.factory = AsyncRequestFactory()
+
+    def call(self, view, method, path, data=None, headers=None, **kwargs):
+        request = self.factory.generic(
+            method,
+            path,
+            json.dumps(data) if data is not None else "",
+            content_type="application/json",
+            **(headers or {}),
+        )
+        force_authenticate(request, self.user)
+        response = async_to_sync(view)(request, **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+        return response
+
+    def test_views_are_coroutines(self):
+        for view in (
+            async_views.event_detail,
+            async_views.get_pre_signed_url,
+            async_views.create_agora_token,
+            async_views.health_check,
+        ):
+            self.assertTrue(asyncio.iscoroutinefunction(view))
+
+    def test_event_detail_matches_retrieve(self):
+        url = f"/api/events/{self.event.pk}/"
+        expected = self.client.get(url)
+        response = self.call(async_views.event_detail, "GET", url, pk=self.event.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response.headers["ETag"], expected.headers["ETag"])
+        headers = {"if-none-match": expected.headers["ETag"]}
+        response = self.call(
+            async_views.event_detail, "GET", url, headers=headers, pk=self.event.pk
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.call(async_views.event_detail, "GET", url, pk=uuid4())
+        self.assertEqual(response.status_code, 404)
+
+    def test_event_detail_sends_writes_to_the_viewset(self):
+        url = f"/api/events/{self.event.pk}/"
+        response = self.call(
+            async_views.event_detail, "PATCH", url, {}, pk=self.event.pk
+        )
+        self.assertEqual(response.status_code, 405)
+
+    def test_agora_token_matches_sync_view(self):
+        data = {"event_id": str(self.event.pk)}
+        expected = post_json(self.client, "/api/agora-token/", data)
+        response = self.call(
+            async_views.create_agora_token, "POST", "/api/agora-token/", data
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), expected.json())
+
+        response = self.call(
+            async_views.create_agora_token,
+            "POST",
+            "/api/agora-token/",
+            {"event_id": str(uuid4())},
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_agora_token_requires_authentication(self):
+        request = self.factory.post(
+            "/api/agora-token/", {}, content_type="application/json"
+        )
+        response = async_to_sync(async_views.create_agora_token)(request)
+        self.assertEqual(response.status_code, 401)
+
+    def test_pre_signed_url(self):
+        url = "/api/event-attachments/get_pre_signed_url/"
+        response = self.call(
+            async_views.get_pre_signed_url, "POST", url, {"file_name": "one.png"}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)["data"]
+        self.assertTrue(data["cloud_id"].startswith("event_attachments/one_"))
+        self.assertIn("url", data["signed_url"])
+        response = self.call(async_views.get_pre_signed_url, "POST", url, {})
+        self.assertEqual(response.status_code, 400)
+
+    def test_health_check(self):
+        response = self.call(async_views.health_check, "GET", "/health/")
+        self.assertEqual(json.loads(response.content), {"status": "healthy"})
+
+
+class ServeCommandTestCase(SimpleTestCase):
+    def serve(self, *args):
+        with mock.patch.object(Server, "run", autospec=True) as run:
+            call_command("serve", "--workers", "3", *args)
+        return run.call_args.args[0]
+
+    def test_preloads_the_wsgi_app_for_threaded_workers(self):
+        server = self.serve("--worker-class", "gthread", "--threads", "8")
+        self.assertTrue(server.cfg.preload_app)
+        self.assertEqual((server.cfg.workers, server.cfg.threads), (3, 8))
+        self.assertEqual(server.cfg.worker_class_str, "gthread")
+        self.assertGreater(server.cfg.max_requests_jitter, 0)
+        self.assertIsInstance(server.load(), WSGIHandler)
+
+    def test_serves_the_asgi_app_with_uvicorn_workers(self):
+        server = self.serve("--worker-class", "uvicorn.workers.UvicornWorker")
+        self.assertIsInstance(server.load(), ASGIHandler)
+
+    def test_exited_workers_are_marked_dead_for_metrics(self):
+        with tempfile.TemporaryDirectory() as path, mock.patch.dict(
+            os.environ, {"PROMETHEUS_MULTIPROC_DIR": path}
+        ):
+            server = self.serve()
+            self.assertIs(server.cfg.child_exit, mark_metrics_dead)
+            for name in ("gauge_livesum_4242.db", "counter_4242.db"):
+                open(os.path.join(path, name), "w").close()
+            server.cfg.child_exit(server, SimpleNamespace(pid=4242))
+            self.assertEqual(os.listdir(path), ["counter_4242.db"])
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        opened = itertools.count()
+        return ConnectionPool(
+            connect=lambda: SimpleNamespace(id=next(opened), usable=True),
+            close=lambda connection: None,
+            check=lambda connection: connection.usable,
+            **kwargs,
+        )
+
+    def test_reuses_released_connections(self):
+        pool = self.make_pool(min_size=2, max_size=4)
+        self.assertEqual(pool.stats()["idle"], 2)
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        self.assertEqual(pool.stats()["connections_opened"], 2)
+
+    def test_unusable_connections_are_replaced(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.acquire()
+        connection.usable = False
+        pool.release(connection)
+        self.assertEqual(pool.acquire().id, 1)
+        stats = pool.stats()
+        self.assertEqual((stats["size"], stats["connections_closed"]), (1, 1))
+
+    def test_exhausted_pool_times_out(self):
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        stats = pool.stats()
+        self.assertEqual((stats["waits"], stats["timeouts"]), (1, 1))
+        self.assertEqual(stats["waiting"], 0)
+
+    def test_released_connections_go_to_waiters(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        waiter.start()
+        while not pool.stats()["waiting"]:
+            time.sleep(0.001)
+        pool.release(connection)
+        waiter.join()
+        self.assertEqual(acquired, [connection])
+        self.assertEqual(pool.stats()["max_waiting"], 1)
+
+
+@skipUnless(connection.vendor == "postgresql", "the pooled backend is for Postgres")
+class PooledBackendTestCase(TestCase):
+    def setUp(self):
+        settings_dict = {
+            **connection.settings_dict,
+            "ENGINE": "core.db.pooled_postgresql",
+            "CONN_MAX_AGE": 0,
+        }
+        backend = load_backend(settings_dict["ENGINE"])
+        self.wrapper = backend.DatabaseWrapper(settings_dict, "pool-test")
+        self.addCleanup(self.close)
+
+    def close(self):
+        self.wrapper.close()
+        self.wrapper.pool.close()
+
+    def test_closing_returns_the_connection(self):
+        self.wrapper.ensure_connection()
+        raw = self.wrapper.connection
+        with self.wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.wrapper.close()
+        self.assertEqual(pool_stats()["pool-test"]["idle"], 1)
+        self.wrapper.ensure_connection()
+        self.assertIs(self.wrapper.connection, raw)
+
+    def test_open_transactions_are_rolled_back(self):
+        self.wrapper.ensure_connection()
+        self.wrapper.set_autocommit(False)
+        with self.wrapper.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.wrapper.close()
+        self.wrapper.ensure_connection()
+        self.assertEqual(
+            self.wrapper.connection.info.transaction_status,
+            extensions.TRANSACTION_STATUS_IDLE,
+        )
+        self.assertTrue(self.wrapper.get_autocommit())
+
+
+class ReplicaRoutingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory(HTTP_AUTHORIZATION="Bearer first")
+        self.middleware = ReplicaRoutingMiddleware(self.respond)
+        overrides = self.settings(DATABASE_REPLICAS=["replica1"])
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(request_finished.send, sender=None)
+        self.addCleanup(cache.clear)
+
+    def respond(self, request):
+        self.read_from = router.db_for_read(Event)
+        self.write_to = router.db_for_write(Event)
+        return HttpResponse(status=201 if request.method == "POST" else 200)
+
+    def test_safe_requests_read_from_replicas(self):
+        self.middleware(self.factory.get("/api/events/"))
+        self.assertEqual(self.read_from, "replica1")
+        self.assertEqual(self.write_to, "default")
+        request_finished.send(sender=None)
+        self.assertEqual(router.db_for_read(Event), "default")
+
+    def test_writers_read_from_the_primary(self):
+        self.middleware(self.factory.post("/api/events/"))
+        self.assertEqual(self.read_from, "default")
+        self.middleware(self.factory.get("/api/events/"))
+        self.assertEqual(self.read_from, "default")
+        # Only the client that wrote is pinned
+        self.middleware(
+            self.factory.get("/api/events/", HTTP_AUTHORIZATION="Bearer second")
+        )
+        self.assertEqual(self.read_from, "replica1")
+
+    def test_pins_expire(self):
+        with self.settings(DATABASE_REPLICA_PIN_SECONDS=0):
+            self.middleware(self.factory.post("/api/events/"))
+        self.middleware(self.factory.get("/api/events/"))
+        self.assertEqual(self.read_from, "replica1")
+
+    def test_without_replicas_reads_use_the_primary(self):
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.middleware(self.factory.get("/api/events/"))
+        self.assertEqual(self.read_from, "default")
+
+    def test_requests_read_from_one_replica(self):
+        replicas = ["replica1", "replica2"]
+        seen = set()
+
+        def respond(request):
+            reads = {router.db_for_read(Event) for _ in range(20)}
+            self.assertEqual(len(reads), 1)
+            seen.update(reads)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(respond)
+        with self.settings(DATABASE_REPLICAS=replicas), mock.patch(
+            "core.routers.random.choice", side_effect=itertools.cycle(replicas)
+        ):
+            for _ in replicas:
+                middleware(self.factory.get("/api/events/"))
+                request_finished.send(sender=None)
+        self.assertEqual(seen, set(replicas))
+
+    def test_async_requests_are_routed_on_the_event_loop(self):
+        threads = []
+        read_from_replicas = routers.read_from_replicas
+
+        def record(allowed):
+            threads.append(threading.get_ident())
+            read_from_replicas(allowed)
+
+        async def respond(request):
+            threads.append(threading.get_ident())
+            return self.respond(request)
+
+        middleware = ReplicaRoutingMiddleware(respond)
+        factory = AsyncRequestFactory()
+        headers = {"authorization": "Bearer first"}
+        with mock.patch.object(routers, "read_from_replicas", record):
+            for request, read_from in (
+                (factory.get("/api/events/", **headers), "replica1"),
+                (factory.post("/api/events/", **headers), "default"),
+                (factory.get("/api/events/", **headers), "default"),
+            ):
+                threads.clear()
+                async_to_sync(middleware)(request)
+                self.assertEqual(self.read_from, read_from)
+                self.assertEqual(len(threads), 2)
+                self.assertEqual(len(set(threads)), 1)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.event = seed_events(1)[0]
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username="scraped"))
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_recorded_by_route(self):
+        route = "api/events/(?P<pk>[^/.]+)/$"
+        requests = self.sample(
+            "herkey_http_requests_total", route=route, method="GET", status="200"
+        )
+        queries = self.sample("herkey_http_request_db_queries_sum", route=route)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f"/api/events/{self.event.pk}/")
+        self.assertEqual(
+            self.sample(
+                "herkey_http_requests_total", route=route, method="GET", status="200"
+            ),
+            requests + 1,
+        )
+        self.assertEqual(
+            self.sample("herkey_http_request_db_queries_sum", route=route),
+            queries + len(context.captured_queries),
+        )
+        self.assertGreaterEqual(
+            self.sample("herkey_http_response_size_bytes_sum", route=route),
+            len(response.content),
+        )
+
+    def test_async_requests_are_recorded_on_the_event_loop(self):
+        threads = []
+        start_request = metrics.start_request
+
+        def record():
+            threads.append(threading.get_ident())
+            return start_request()
+
+        async def respond(request):
+            threads.append(threading.get_ident())
+            return HttpResponse()
+
+        with mock.patch.object(metrics, "start_request", record):
+            async_to_sync(MetricsMiddleware(respond))(
+                AsyncRequestFactory().get("/api/health/")
+            )
+        self.assertEqual(len(threads), 2)
+        self.assertEqual(len(set(threads)), 1)
+
+    def test_queries_outside_requests_are_not_counted(self):
+        stats = metrics.start_request()
+        metrics._request_stats.set(None)
+        Event.objects.count()
+        self.assertEqual(stats.queries, 0)
+
+    def test_outbound_calls_are_timed(self):
+        labels = {"service": "s3", "operation": "generate_presigned_post"}
+        calls = self.sample("herkey_outbound_call_duration_seconds_count", **labels)
+        post_json(
+            self.client,
+            "/api/event-attachments/get_pre_signed_url/",
+            {"file_name": "a.pdf"},
+        )
+        self.assertEqual(
+            self.sample("herkey_outbound_call_duration_seconds_count", **labels),
+            calls + 1,
+        )
+
+    def test_metrics_endpoint(self):
+        self.client.get("/health/")
+        with self.settings(METRICS_AUTH_TOKEN="scrape"):
+            self.assertEqual(self.client.get("/metrics").status_code, 401)
+            response = self.client.get(
+                "/metrics", HTTP_AUTHORIZATION="Bearer scrape"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            b'herkey_http_requests_total{method="GET",route="health/"',
+            response.content,
+        )
+
+    def test_metrics_endpoint_fails_closed_without_a_token(self):
+        with self.settings(METRICS_AUTH_TOKEN=""):
+            self.assertEqual(self.client.get("/metrics").status_code, 401)
+            with self.settings(DEBUG=True):
+                self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class StackSamplerTestCase(SimpleTestCase):
+    def test_samples_the_running_function(self):
+        with StackSampler(interval=0.001) as sampler:
+            spin(0.05)
+        self.assertGreater(sampler.samples, 0)
+        stack = sampler.stacks.most_common(1)[0][0]
+        root, *_, leaf = stack.split(";")
+        self.assertIn("test_samples_the_running_function", root)
+        self.assertEqual(leaf, "core.tests.spin")
+
+    def test_stacks_without_the_root_are_left_out(self):
+        frame = sys._getframe()
+        self.assertIsNone(collapse(frame, root=object()))
+        self.assertEqual(collapse(frame, root=frame), frame_name(frame))
+
+    def test_rank_functions(self):
+        own, total = rank_functions({"a;b;c": 3, "a;b": 1, "a;a": 2})
+        self.assertEqual(own, {"c": 3, "b": 1, "a": 2})
+        self.assertEqual(total, {"a": 6, "b": 4, "c": 3})
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        overrides = self.settings(PROFILER_DIR=self.directory.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create(username="profiled", is_staff=True)
+        self.token = str(AccessToken.for_user(self.user))
+        self.client = APIClient()
+
+    def get(self, **headers):
+        return self.client.get(
+            "/api/events/", HTTP_AUTHORIZATION=f"Bearer {self.token}", **headers
+        )
+
+    def profiles(self):
+        return sorted(os.listdir(self.directory.name))
+
+    def test_admins_ask_for_profiles(self):
+        response = self.get(HTTP_X_PROFILE="1")
+        self.assertEqual(self.profiles(), [response.headers["X-Profile"]])
+        self.assertIn("-event-list-", response.headers["X-Profile"])
+        self.user.is_staff = False
+        self.user.save()
+        self.assertNotIn("X-Profile", self.get(HTTP_X_PROFILE="1").headers)
+        self.assertEqual(len(self.profiles()), 1)
+
+    def test_sampled_requests_are_profiled(self):
+        with self.settings(PROFILER_SAMPLE_RATE=1.0, PROFILER_MAX_FILES=2):
+            for _ in range(3):
+                response = self.get()
+        self.assertNotIn("X-Profile", response.headers)
+        self.assertEqual(len(self.profiles()), 2)
+        with self.settings(PROFILER_SAMPLE_RATE=0.0):
+            self.get()
+        self.assertEqual(len(self.profiles()), 2)
+
+    def test_profile_report(self):
+        for name, stacks in (
+            ("20261018T000000.000000-1-event-list-9ms.folded", "a;b;c 3\na;b 1\n"),
+            ("20261018T000001.000000-1-agora_token-9ms.folded", "a;d 4\n"),
+        ):
+            with open(os.path.join(self.directory.name, name), "w") as profile:
+                profile.write(stacks)
+        stdout = io.StringIO()
+        call_command("profile_report", "--view", "event-list", stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(lines[0], "4 samples from 1 profiles, by self")
+        self.assertEqual(lines[2].split(), ["75.0%", "75.0%", "c"])
+
+
+class BenchCommandTestCase(TestCase):
+    def bench(self, *args):
+        stdout = io.StringIO()
+        call_command(
+            "bench",
+            "--users=5",
+            "--events=3",
+            "--participants=2",
+            "--requests=3",
+            "--warmup=1",
+            *args,
+            stdout=stdout,
+        )
+        return json.loads(stdout.getvalue())
+
+    def test_every_endpoint_succeeds(self):
+        report = self.bench()
+        self.assertEqual(report["meta"]["dataset"]["events"], 3)
+        self.assertIn("agora_token", report["endpoints"])
+        for name, result in report["endpoints"].items():
+            self.assertEqual(result["errors"], 0, name)
+            self.assertEqual(result["requests"], 3)
+            latency = result["latency_ms"]
+            self.assertLessEqual(latency["p50"], latency["p95"])
+            self.assertLessEqual(latency["p95"], latency["p99"])
+        self.assertGreater(report["endpoints"]["event_list"]["queries"]["mean"], 0)
+        # The seeded rows are rolled back
+        self.assertFalse(Event.objects.exists())
+
+    def test_endpoint_selection(self):
+        report = self.bench("--endpoint=presigned_url", "--endpoint=user_list")
+        self.assertEqual(set(report["endpoints"]), {"presigned_url", "user_list"})
+        with self.assertRaises(CommandError):
+            self.bench("--endpoint=nope")
@@ -1,40 +1,132 @@
 """ Views for the core app. """
 
+import csv
+import io
+from functools import partial
 from json import JSONDecodeError
-from uuid import UUID, uuid4
-import boto3
+from uuid import UUID
 
 
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.db import IntegrityError
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
+from django.utils.crypto import constant_time_compare
 
 from rest_framework import status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.parsers import JSONParser
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework_simplejwt.views import TokenObtainPairView
 
-from .agora import create_agora_rtc_token_publisher, create_agora_rtm_token_publisher
+from . import event_cache, metrics
+from .agora import participant_agora_tokens
+from .conditional import ConditionalGetViewSetMixin
+from .db.pooled_postgresql.base import pool_stats
 from .models import Event, EventParticipant, EventAttachment
+from .fieldsets import Resource, SparseFieldsetViewSetMixin
+from .filters import FilteredViewSetMixin, OrderingFilter
+from .pagination import PaginatedViewSetMixin, UserCursorPagination
+from .premint import premint_event_tokens
+from .s3 import generate_presigned_upload
 from .serializers import (
     EventSerializer,
     EventParticipantsSerializer,
     EventAttachmentSerializer,
+    EventAttachmentBulkSerializer,
     UserSerializer,
     CustomTokenObtainPairSerializer,
 )
 
 
-class EventViewSet(viewsets.ViewSet):
+EVENT_RESOURCE = Resource(
+    "event", EventSerializer, nested_fields=("participants", "attachments")
+)
+
+PARTICIPANT_RESOURCE = Resource(
+    "event-participant",
+    EventParticipantsSerializer,
+    nested_fields=("user",),
+    relationship_types={"event": EVENT_RESOURCE.name},
+)
+
+
+class EventDocumentMixin:
+    """
+    Renders single event documents for the event cache. Shared by
+    ``EventViewSet`` and the async event detail view.
+    """
+
+    def render_document(self, pk, fields):
+        """Render event ``pk`` with ``fields`` through the accepted renderer."""
+        events = Event.objects.with_related(
+            participants="participants" in fields,
+            attachments="attachments" in fields,
+        ).only(*self.resource.get_columns(fields))
+        event = get_object_or_404(events, pk=pk)
+        serializer = EventSerializer(event, fields=fields)
+        return self.request.accepted_renderer.render(
+            serializer.data,
+            self.request.accepted_media_type,
+            self.get_renderer_context(),
+        )
+
+    def get_document_variant(self, fields, validators):
+        # Documents are keyed on the ETag the request computed from the
+        # database, so a process whose copy outlived an invalidation made in
+        # another process builds a new one rather than serving it. The ETag
+        # covers the signed URL window of documents with attachments.
+        etag, _ = validators
+        return (fields, self.request.accepted_media_type, etag)
+
+    def document_response(self, content, validators):
+        response = HttpResponse(content, content_type=self.request.accepted_media_type)
+        return self.set_validators(response, validators)
+
+
+def read_user_ids_csv(upload):
+    """
+    Read user ids from the first column of an uploaded CSV, skipping a header
+    row if there is one."""
+    rows = csv.reader(io.TextIOWrapper(upload, encoding="utf-8"))
+    user_ids = []
+    for position, row in enumerate(rows):
+        if not row or not row[0].strip():
+            continue
+        if position == 0 and not row[0].strip().isdigit():
+            continue
+        user_ids.append(int(row[0]))
+    return user_ids
+
+
+class EventViewSet(
+    EventDocumentMixin,
+    ConditionalGetViewSetMixin,
+    SparseFieldsetViewSetMixin,
+    FilteredViewSetMixin,
+    PaginatedViewSetMixin,
+    viewsets.ViewSet,
+):
     """
     A simple APIView for creating event entires.
     """
 
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticated]
+    resource = EVENT_RESOURCE
+    resource_name = EVENT_RESOURCE.name
+    # Each filter is served by an index on Event, see its Meta.indexes
+    filterset_fields = {
+        "type": ("exact", "in"),
+        "active": ("exact",),
+        "scheduled_date": ("gte", "lte", "gt", "lt"),
+        "end_date": ("gte", "lte", "gt", "lt"),
+    }
+    ordering_fields = ("created", "scheduled_date", "end_date")
+    ordering = ("-created", "-id")
 
     def get_serializer_context(self):
         """ "
@@ -82,18 +174,66 @@ class EventViewSet(viewsets.ViewSet):
 
     def list(self, request):
         """ "
-        Return all event entries."""
-        events = Event.objects.all().order_by("-created")
-        serializer = EventSerializer(events, many=True)
-        return Response(serializer.data)
+        Return a page of event entries, newest first. With ``?summary=true``
+        events carry participant/attachment counts instead of nested lists.
+        ``filter[type]``, ``filter[active]`` and ``filter[scheduled_date.gte]``
+        style date ranges narrow the list and ``sort`` reorders it."""
+        fields = self.get_fields()
+        events = self.filter_queryset(Event.objects.all())
+        if not self.resource.has_nested(fields):
+            return self.paginated_values_response(events, fields)
+        events = events.with_related(
+            participants="participants" in fields, attachments="attachments" in fields
+        ).only(*self.resource.get_columns(fields, self.get_page_ordering(events)))
+        return self.paginated_response(events, EventSerializer, fields=fields)
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """
+        Events matching ``filter[search]``, best match first. Every search
+        word matches as a prefix, so a partly typed word already finds
+        results. Other filters apply, ``sort`` replaces the ranking and
+        ``page[size]`` caps the number of results."""
+        if not request.query_params.get(api_settings.SEARCH_PARAM, "").strip():
+            return Response(
+                {"error": f"{api_settings.SEARCH_PARAM} is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            size = int(request.query_params.get("page[size]", settings.PAGE_SIZE))
+        except ValueError:
+            size = settings.PAGE_SIZE
+        size = max(1, min(size, settings.MAX_PAGE_SIZE))
+        fields = self.get_fields()
+        events = self.filter_queryset(Event.objects.all())
+        if OrderingFilter.ordering_param not in request.query_params:
+            events = events.order_by("-rank", "-created", "-id")
+        if not self.resource.has_nested(fields):
+            return self.values_response(events[:size], fields)
+        events = events.with_related(
+            participants="participants" in fields, attachments="attachments" in fields
+        ).only(*self.resource.get_columns(fields))
+        return Response(EventSerializer(events[:size], many=True, fields=fields).data)
 
     def retrieve(self, request, pk=None):
         """Retrieve a single event entry by ID."""
         if not isinstance(pk, UUID):
             pk = UUID(pk)
-        event = get_object_or_404(Event, pk=pk)
-        serializer = EventSerializer(event)
-        return Response(serializer.data)
+        fields = self.get_fields()
+        validators = self.get_validators(
+            pk,
+            participants="participants" in fields,
+            attachments="attachments" in fields,
+        )
+        not_modified = self.not_modified_response(validators)
+        if not_modified is not None:
+            return not_modified
+        content = event_cache.get_or_build(
+            pk,
+            self.get_document_variant(fields, validators),
+            partial(self.render_document, pk, fields),
+        )
+        return self.document_response(content, validators)
 
     def destroy(self, request):
         """ "
@@ -119,22 +259,93 @@ class EventViewSet(viewsets.ViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=["post"])
+    def mint_tokens(self, request, pk=None):
+        """
+        Pre-mint Agora tokens for every participant. Hosts only. Tokens are
+        minted in this worker, since forking a process pool from a threaded
+        web worker is unsafe; ``premint_agora_tokens`` spreads large events
+        over processes."""
+        event = get_object_or_404(Event, pk=pk)
+        if not self.is_host(event):
+            return Response(
+                {"error": "Only hosts of this event can mint tokens"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        return Response(premint_event_tokens(event, workers=1))
+
+    @action(detail=True, methods=["post"], parser_classes=[JSONParser, MultiPartParser])
+    def import_participants(self, request, pk=None):
+        """
+        Register many users at once, from a JSON ``user_ids`` list or an
+        uploaded CSV ``file`` with one user id per row. Hosts only."""
+        event = get_object_or_404(Event, pk=pk)
+        if not self.is_host(event):
+            return Response(
+                {"error": "Only hosts of this event can import participants"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        try:
+            if "file" in request.FILES:
+                user_ids = read_user_ids_csv(request.FILES["file"])
+            else:
+                user_ids = [int(user_id) for user_id in request.data["user_ids"]]
+        except (KeyError, TypeError, ValueError, UnicodeDecodeError, csv.Error):
+            return Response(
+                {"error": "Provide a user_ids list or a CSV file of user ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        added, unknown = EventParticipant.objects.bulk_register(
+            event, user_ids, chunk_size=settings.PARTICIPANT_IMPORT_CHUNK_SIZE
+        )
+        return Response(
+            {"requested": len(user_ids), "added": added, "unknown_user_ids": unknown}
+        )
+
+    def is_host(self, event):
+        """Whether the requesting user is a host of ``event``."""
+        return EventParticipant.objects.filter(
+            event=event, user_id=self.request.user.pk, type="HOST"
+        ).exists()
+
     @action(detail=True, methods=["get"])
     def get_participants(self, request, pk=None):
-        """Get all participants of an event."""
-        event = get_object_or_404(Event, pk=pk)
-        participants = event.participants.all()
-        serializer = EventParticipantsSerializer(participants, many=True)
-        return Response(serializer.data)
+        """
+        Get all participants of an event. With ``?stream=true`` they are
+        streamed through a server-side cursor instead of built in memory."""
+        validators = self.get_validators(pk, attachments=False)
+        not_modified = self.not_modified_response(validators)
+        if not_modified is not None:
+            return not_modified
+        participants = (
+            EventParticipant.objects.filter(event=pk)
+            .select_related("user")
+            .defer("agora_tokens")
+        )
+        if self.wants_stream():
+            response = self.streaming_response(
+                participants,
+                self.get_fields(PARTICIPANT_RESOURCE),
+                PARTICIPANT_RESOURCE,
+            )
+        else:
+            serializer = EventParticipantsSerializer(participants, many=True)
+            response = Response(serializer.data)
+            self.resource_name = PARTICIPANT_RESOURCE.name
+        return self.set_validators(response, validators)
 
 
-class EventParticipantViewSet(viewsets.ViewSet):
+class EventParticipantViewSet(
+    SparseFieldsetViewSetMixin, PaginatedViewSetMixin, viewsets.ViewSet
+):
     """
     A simple APIView for creating event participant entires.
     """
 
     serializer_class = EventParticipantsSerializer
     permission_classes = [IsAuthenticated]
+    resource = PARTICIPANT_RESOURCE
+    resource_name = PARTICIPANT_RESOURCE.name
 
     def get_serializer_context(self):
         """ "
@@ -152,11 +363,20 @@ class EventParticipantViewSet(viewsets.ViewSet):
         Create a new event participant entry."""
         try:
             data = JSONParser().parse(request)
-            username = request.user.username
-            user = get_object_or_404(User, username=username)
-            event_id = data.get("event")
-            event = get_object_or_404(Event, id=event_id)
-            if EventParticipant.objects.filter(user=user, event=event).exists():
+            event_id = data.pop("event", None)
+            try:
+                event_id = UUID(str(event_id))
+            except ValueError:
+                raise Http404
+            serializer = EventParticipantsSerializer(data=data, partial=True)
+            serializer.is_valid(raise_exception=True)
+            try:
+                participant = EventParticipant.objects.register(
+                    event_id=event_id, user=request.user, **serializer.validated_data
+                )
+            except Event.DoesNotExist:
+                raise Http404
+            if participant is None:
                 return JsonResponse(
                     {
                         "result": "error",
@@ -164,12 +384,7 @@ class EventParticipantViewSet(viewsets.ViewSet):
                     },
                     status=400,
                 )
-            serializer = EventParticipantsSerializer(data=data)
-            if serializer.is_valid(raise_exception=True):
-                serializer.save(user=user, event=event)
-                return Response(serializer.data)
-            print(serializer.errors)
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return Response(EventParticipantsSerializer(participant).data)
         except JSONDecodeError:
             return JsonResponse(
                 {"result": "error", "message": "Json decoding error"}, status=400
@@ -177,17 +392,39 @@ class EventParticipantViewSet(viewsets.ViewSet):
 
     def list(self, request):
         """ "
-        Return all event entries."""
-        event_participants = EventParticipant.objects.all()
-        serializer = EventParticipantsSerializer(event_participants, many=True)
-        return Response(serializer.data)
+        Return a page of event participant entries, newest first. With
+        ``?summary=true`` participants carry ``user_id`` without the nested user,
+        and ``?stream=true`` streams every participant instead of one page."""
+        fields = self.get_fields()
+        if self.wants_stream():
+            return self.streaming_response(
+                EventParticipant.objects.select_related("user").defer("agora_tokens"),
+                fields,
+            )
+        if not self.resource.has_nested(fields):
+            return self.paginated_values_response(
+                EventParticipant.objects.all(), fields
+            )
+        event_participants = EventParticipant.objects.select_related("user").defer(
+            "agora_tokens"
+        )
+        return self.paginated_response(
+            event_participants, EventParticipantsSerializer, fields=fields
+        )
 
     def retrieve(self, request, pk=None):
         """Retrieve a single event entry by ID."""
         if not isinstance(pk, UUID):
-            pk = UUID(pk)
-        event_participant = get_object_or_404(EventParticipant, pk=pk)
-        serializer = EventParticipantsSerializer(event_participant)
+            try:
+                pk = UUID(pk)
+            except ValueError:
+                raise Http404
+        fields = self.get_fields()
+        event_participants = EventParticipant.objects.defer("agora_tokens")
+        if self.resource.has_nested(fields):
+            event_participants = event_participants.select_related("user")
+        event_participant = get_object_or_404(event_participants, pk=pk)
+        serializer = EventParticipantsSerializer(event_participant, fields=fields)
         return Response(serializer.data)
 
     def destroy(self, request, pk=None):
@@ -237,6 +474,36 @@ class EventAttachmentViewSet(viewsets.ViewSet):
                 {"result": "error", "message": "Json decoding error"}, status=400
             )
 
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Register many attachments of one event in a single insert."""
+        try:
+            data = JSONParser().parse(request)
+        except JSONDecodeError:
+            return JsonResponse(
+                {"result": "error", "message": "Json decoding error"}, status=400
+            )
+        event = get_object_or_404(Event, id=data.get("event"))
+        serializer = EventAttachmentBulkSerializer(
+            data=data.get("attachments"),
+            many=True,
+            max_length=settings.ATTACHMENT_BATCH_MAX_SIZE,
+            allow_empty=False,
+            context={"event": event},
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            attachments = serializer.save(event=event)
+        except IntegrityError:
+            return Response(
+                {"error": "This event already has a banner."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            EventAttachmentSerializer(attachments, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
     def delete(self, request):
         """ "
         Delete an existing event attachment entry."""
@@ -255,6 +522,8 @@ class UserViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = UserCursorPagination
+    ordering = ("id",)
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
@@ -267,62 +536,103 @@ def get_pre_signed_url(request):
     """Get a pre-signed URL for an attachment."""
     data = JSONParser().parse(request)
     file_name = data.get("file_name")
-    file_name_without_extension = file_name.split(".")[0]
     if not file_name:
         return Response(
             {"error": "attachment_cloud_id is required"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    cloud_id = f"event_attachments/{file_name_without_extension}_{uuid4()}"
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION,
-    )
-    fields = None
-    conditions = None
     try:
-        signed_url = s3_client.generate_presigned_post(
-            settings.AWS_STORAGE_BUCKET_NAME,
-            cloud_id,
-            Fields=fields,
-            Conditions=conditions,
-            ExpiresIn=3600,  # URL expiration time in seconds
-        )
+        cloud_id, signed_url = generate_presigned_upload(file_name)
         return Response({"signed_url": signed_url, "cloud_id": cloud_id})
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def get_pre_signed_urls(request):
+    """Get pre-signed upload URLs for a list of attachments in one call."""
+    data = JSONParser().parse(request)
+    file_names = data.get("file_names")
+    if (
+        not isinstance(file_names, list)
+        or not file_names
+        or not all(isinstance(file_name, str) and file_name for file_name in file_names)
+    ):
+        return Response(
+            {"error": "file_names must be a non-empty list of file names"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(file_names) > settings.ATTACHMENT_BATCH_MAX_SIZE:
+        return Response(
+            {
+                "error": f"At most {settings.ATTACHMENT_BATCH_MAX_SIZE} "
+                "file names are allowed per request"
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        uploads = []
+        for file_name in file_names:
+            cloud_id, signed_url = generate_presigned_upload(file_name)
+            uploads.append(
+                {"file_name": file_name, "signed_url": signed_url, "cloud_id": cloud_id}
+            )
+        return Response({"uploads": uploads})
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_agora_token(request):
     """Create an Agora RTC token for a publisher."""
     data = JSONParser().parse(request)
-    username = request.user
     channel_name = data.get("event_id")
-    event = get_object_or_404(Event, id=channel_name)
-    user = get_object_or_404(User, username=username)
-    serializer = UserSerializer(user)
-    event_participant = get_object_or_404(EventParticipant, event=event, user=user)
-    role = "host" if event_participant.type == "HOST" else "audience"
-    user_id = serializer.data.get("id")
-    rtc_token = create_agora_rtc_token_publisher(channel_name, user_id, role)
-    rtc_screen_share_token = create_agora_rtc_token_publisher(
-        channel_name, user_id + 100, role
+    user_id = request.user.pk
+    event_participant = get_object_or_404(
+        EventParticipant.objects.only("event_id", "type", "agora_tokens"),
+        event_id=channel_name,
+        user_id=user_id,
     )
-    rtm_token = create_agora_rtm_token_publisher(channel_name, user_id, role)
     return Response(
-        {
-            "rtc_token": rtc_token,
-            "rtc_screen_share_token": rtc_screen_share_token,
-            "rtm_token": rtm_token,
-        }
+        participant_agora_tokens(event_participant, channel_name, user_id)
     )
 
 
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def event_cache_stats(request):
+    """Hit ratio and rebuild latency of this process's event cache."""
+    return JsonResponse(event_cache.stats.as_dict())
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def db_pool_stats(request):
+    """Size, wait queue and timeouts of this process's database pools."""
+    return JsonResponse(pool_stats())
+
+
+def prometheus_metrics(request):
+    """
+    The API's metrics in Prometheus' text format. Scrapers must send
+    METRICS_AUTH_TOKEN as a bearer token. Without one, the metrics are only
+    served with DEBUG on."""
+    if not settings.METRICS_AUTH_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    elif not constant_time_compare(
+        request.headers.get("Authorization", ""),
+        f"Bearer {settings.METRICS_AUTH_TOKEN}",
+    ):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    content, content_type = metrics.render_metrics()
+    return HttpResponse(content, content_type=content_type)
+
+
 @api_view(["GET"])
 def health_check(request):
     return JsonResponse({"status": "healthy"})
@@ -3,8 +3,10 @@ Settings for Herkey project.
 """
 
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
+from urllib.parse import urlsplit
 
 import logging.config
 from dotenv import load_dotenv
@@ -20,21 +22,30 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
-DEBUG = int(os.environ.get("DEBUG", default=0))
-ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS").split(" ")
-
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = bool(int(os.environ.get("DEBUG", default=0)))
+ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS").split(" ")
 
 #AWS credentials
 AWS_ACCESS_KEY_ID = os.environ.get("AWS_ACCESS_KEY")
 AWS_SECRET_ACCESS_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.environ.get("AWS_STORAGE_BUCKET_NAME")
 AWS_REGION = os.environ.get("AWS_REGION")
+S3_SIGNED_URL_EXPIRES = int(os.environ.get("S3_SIGNED_URL_EXPIRES", 7200))
+S3_SIGNED_URL_CACHE_SIZE = int(os.environ.get("S3_SIGNED_URL_CACHE_SIZE", 10000))
+ATTACHMENT_BATCH_MAX_SIZE = int(os.environ.get("ATTACHMENT_BATCH_MAX_SIZE", 100))
 
 # Agora credentials
 AGORA_APP_ID = os.environ.get("AGORA_APP_ID")
 AGORA_APP_CERTIFICATE = os.environ.get("AGORA_APP_CERTIFICATE")
+AGORA_TOKEN_CACHE_SIZE = int(os.environ.get("AGORA_TOKEN_CACHE_SIZE", 100000))
+AGORA_TOKEN_MIN_REMAINING_FRACTION = float(
+    os.environ.get("AGORA_TOKEN_MIN_REMAINING_FRACTION", 0.5)
+)
+AGORA_PREMINT_WORKERS = int(
+    os.environ.get("AGORA_PREMINT_WORKERS", os.cpu_count() or 1)
+)
+AGORA_PREMINT_CHUNK_SIZE = int(os.environ.get("AGORA_PREMINT_CHUNK_SIZE", 1000))
 
 
 # Application definition
@@ -54,6 +65,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -62,6 +74,29 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-route latency, SQL and response size metrics, and S3/Agora call
+# timings, served at /metrics, see core/metrics.py. Scrapers must send
+# METRICS_AUTH_TOKEN as a bearer token; without one, /metrics is only
+# served with DEBUG on.
+METRICS_ENABLED = bool(int(os.environ.get("METRICS_ENABLED", 1)))
+METRICS_AUTH_TOKEN = os.environ.get("METRICS_AUTH_TOKEN", "")
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'core.middleware.MetricsMiddleware')
+
+# Stack sampling of views, see core/profiling.py. Admins get a profile of a
+# request by sending the PROFILER_HEADER header, and PROFILER_SAMPLE_RATE of
+# all requests are profiled. Profiles go to PROFILER_DIR, which keeps the
+# newest PROFILER_MAX_FILES, and `python manage.py profile_report` ranks
+# their hottest functions.
+PROFILER_HEADER = "X-Profile"
+PROFILER_SAMPLE_RATE = float(os.environ.get("PROFILER_SAMPLE_RATE", 0))
+PROFILER_INTERVAL = float(os.environ.get("PROFILER_INTERVAL", 0.005))
+PROFILER_DIR = os.environ.get(
+    "PROFILER_DIR", os.path.join(tempfile.gettempdir(), "herkey-profiles")
+)
+PROFILER_MAX_FILES = int(os.environ.get("PROFILER_MAX_FILES", 500))
+MIDDLEWARE.append('core.middleware.ProfilingMiddleware')
+
 ROOT_URLCONF = 'herkey.urls'
 
 TEMPLATES = [
@@ -81,21 +116,119 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'herkey.wsgi.application'
+ASGI_APPLICATION = 'herkey.asgi.application'
+
+# Route the agora-token, pre-signed URL, health check and event detail
+# endpoints to their async views in core.async_views. Worth it when serving
+# through herkey.asgi, see the README.
+ASYNC_VIEWS = bool(int(os.environ.get("ASYNC_VIEWS", 0)))
+
+# Production server, see core/management/commands/serve.py. Each gthread
+# worker holds up to SERVER_THREADS database connections at once.
+SERVER_BIND = os.environ.get("SERVER_BIND", "0.0.0.0:8000")
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", 2 * (os.cpu_count() or 1) + 1))
+SERVER_WORKER_CLASS = os.environ.get(
+    "SERVER_WORKER_CLASS",
+    "uvicorn.workers.UvicornWorker" if ASYNC_VIEWS else "gthread",
+)
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 4))
+SERVER_MAX_REQUESTS = int(os.environ.get("SERVER_MAX_REQUESTS", 5000))
+SERVER_MAX_REQUESTS_JITTER = int(os.environ.get("SERVER_MAX_REQUESTS_JITTER", 500))
+SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", 30))
+SERVER_GRACEFUL_TIMEOUT = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
+SERVER_KEEPALIVE = int(os.environ.get("SERVER_KEEPALIVE", 5))
+SERVER_ACCESS_LOG = os.environ.get("SERVER_ACCESS_LOG") or None
 
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
+# With DATABASE_POOL on, connections come from a pool in each process, see
+# core/db/pooled_postgresql. Requests then hold a connection only while they
+# run, so CONN_MAX_AGE defaults to 0. Without the pool, connections persist
+# for DATABASE_CONN_MAX_AGE seconds, except under ASGI where a request's
+# thread does not outlive it. Health checks test a reused connection before
+# a request runs on it.
+DATABASE_POOL = bool(int(os.getenv('DATABASE_POOL', 0)))
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'core.db.pooled_postgresql'
+            if DATABASE_POOL
+            else 'django.db.backends.postgresql'
+        ),
         'HOST': os.getenv('DATABASE_HOST', 'localhost'),
         'PORT': os.getenv('DATABASE_PORT', '5432'),
         'NAME': os.getenv('DATABASE_NAME', 'mydatabase'),
         'USER': os.getenv('DATABASE_USER', 'myuser'),
         'PASSWORD': os.getenv('DATABASE_PASSWORD', 'mypassword'),
+        'CONN_MAX_AGE': int(
+            os.getenv(
+                'DATABASE_CONN_MAX_AGE', 0 if DATABASE_POOL or ASYNC_VIEWS else 60
+            )
+        ),
+        'CONN_HEALTH_CHECKS': bool(int(os.getenv('DATABASE_CONN_HEALTH_CHECKS', 1))),
+        'POOL': {
+            'MIN_SIZE': int(os.getenv('DATABASE_POOL_MIN_SIZE', 0)),
+            # Per process: keep SERVER_WORKERS x DATABASE_POOL_MAX_SIZE below
+            # Postgres' max_connections
+            'MAX_SIZE': int(os.getenv('DATABASE_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.getenv('DATABASE_POOL_TIMEOUT', 10)),
+        },
     }
 }
 
+# Read replicas, as space-separated "host[:port][/name]" entries that
+# otherwise share the default database's settings. Safe-method requests read
+# from them, except for DATABASE_REPLICA_PIN_SECONDS after the client wrote,
+# see core/routers.py. The pins live in DATABASE_REPLICA_PIN_CACHE, which
+# must be shared between processes when serving with several workers.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(os.getenv('DATABASE_REPLICA_HOSTS', '').split(), 1):
+    replica = urlsplit('//' + replica)
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': replica.hostname,
+        'PORT': str(replica.port or DATABASES['default']['PORT']),
+        'NAME': replica.path.lstrip('/') or DATABASES['default']['NAME'],
+        # The test runner must not create a test database on a replica
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv('DATABASE_REPLICA_PIN_SECONDS', 10))
+DATABASE_REPLICA_PIN_CACHE = os.getenv('DATABASE_REPLICA_PIN_CACHE', 'default')
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Rendered event documents live in the "events" cache. It is local memory by
+# default; point EVENT_CACHE_BACKEND/EVENT_CACHE_LOCATION at a shared backend
+# such as django.core.cache.backends.redis.RedisCache to share it between
+# processes. CACHE_BACKEND/CACHE_LOCATION do the same for the default cache.
+EVENT_CACHE_BACKEND = os.environ.get(
+    "EVENT_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+)
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    },
+    "events": {
+        "BACKEND": EVENT_CACHE_BACKEND,
+        "LOCATION": os.environ.get("EVENT_CACHE_LOCATION", "events"),
+        "TIMEOUT": int(os.environ.get("EVENT_CACHE_TIMEOUT", 300)),
+    },
+}
+if EVENT_CACHE_BACKEND.endswith("LocMemCache"):
+    CACHES["events"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.environ.get("EVENT_CACHE_MAX_ENTRIES", 10000)),
+    }
+# How long a request waits for another to rebuild a document before
+# rebuilding it itself
+EVENT_CACHE_LOCK_TIMEOUT = float(os.environ.get("EVENT_CACHE_LOCK_TIMEOUT", 5))
+
 CSRF_TRUSTED_ORIGINS = [
     'https://herkey-app.webdura.info',
     # You can add other domains if necessary
@@ -142,6 +275,19 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Bulk participant import
+PARTICIPANT_IMPORT_CHUNK_SIZE = int(
+    os.environ.get("PARTICIPANT_IMPORT_CHUNK_SIZE", 1000)
+)
+
+# Pagination
+PAGE_SIZE = int(os.environ.get("PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 500))
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 2000))
+
+# Authenticate requests from the JWT's claims alone, without loading the User
+JWT_STATELESS_AUTH = bool(int(os.environ.get("JWT_STATELESS_AUTH", 0)))
+
 REST_FRAMEWORK = {
     "EXCEPTION_HANDLER": "rest_framework_json_api.exceptions.exception_handler",
     'DEFAULT_PARSER_CLASSES': [
@@ -149,14 +295,14 @@ REST_FRAMEWORK = {
         'rest_framework_json_api.parsers.JSONParser',
     ],
     "DEFAULT_RENDERER_CLASSES": (
-        "rest_framework_json_api.renderers.JSONRenderer",
+        "core.renderers.JSONRenderer",
     ),
     "DEFAULT_METADATA_CLASS": "rest_framework_json_api.metadata.JSONAPIMetadata",
     "DEFAULT_FILTER_BACKENDS": (
-        "rest_framework_json_api.filters.QueryParameterValidationFilter",
-        "rest_framework_json_api.filters.OrderingFilter",
+        "core.filters.QueryParameterValidationFilter",
+        "core.filters.OrderingFilter",
         "rest_framework_json_api.django_filters.DjangoFilterBackend",
-        "rest_framework.filters.SearchFilter",
+        "core.filters.SearchFilter",
     ),
     "SEARCH_PARAM": "filter[search]",
     "TEST_REQUEST_RENDERER_CLASSES": (
@@ -164,7 +310,9 @@ REST_FRAMEWORK = {
     ),
     "TEST_REQUEST_DEFAULT_FORMAT": "vnd.api+json",
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.StatelessJWTAuthentication'
+        if JWT_STATELESS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
 }
 
@@ -193,7 +341,7 @@ SIMPLE_JWT = {
 
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
-    "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
+    "TOKEN_USER_CLASS": "core.authentication.TokenUser",
 
     "JTI_CLAIM": "jti",
 
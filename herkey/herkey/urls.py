@@ -1,19 +1,25 @@
 """
 URL configuration for the Herkey project.
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from core import async_views
 from core.views import (
     EventViewSet,
     EventParticipantViewSet,
     EventAttachmentViewSet,
     UserViewSet,
     get_pre_signed_url,
+    get_pre_signed_urls,
     create_agora_token,
+    event_cache_stats,
+    db_pool_stats,
     health_check,
+    prometheus_metrics,
     CustomTokenObtainPairView
 )
 
@@ -28,8 +34,21 @@ urlpatterns = [
     path('admin/', admin.site.urls), # Admin site
     path('api/', include(router.urls)), # API routes from the router
     path('api/event-attachments/get_pre_signed_url/', get_pre_signed_url, name='get_pre_signed_url'), # Pre-signed URL for event attachments
+    path('api/event-attachments/get_pre_signed_urls/', get_pre_signed_urls, name='get_pre_signed_urls'), # Batch pre-signed URLs for event attachments
     path('api/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'), # JWT token obtain pair
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),# JWT token refresh
     path('api/agora-token/', create_agora_token, name='agora_token'), # Agora token creation
+    path('api/event-cache/stats/', event_cache_stats, name='event_cache_stats'), # Event cache hit ratio and rebuild latency
+    path('api/db-pool/stats/', db_pool_stats, name='db_pool_stats'), # Database pool size and wait queue
     path('health/', health_check, name='health_check'),# Health check endpoint
+    path('metrics', prometheus_metrics, name='metrics'), # Prometheus metrics
 ]
+
+# Async views shadow the synchronous versions of the same endpoints
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('api/events/<uuid:pk>/', async_views.event_detail, name='event-detail'), # Async event detail
+        path('api/event-attachments/get_pre_signed_url/', async_views.get_pre_signed_url, name='get_pre_signed_url'), # Async pre-signed URL
+        path('api/agora-token/', async_views.create_agora_token, name='agora_token'), # Async Agora token creation
+        path('health/', async_views.health_check, name='health_check'), # Async health check
+    ] + urlpatterns
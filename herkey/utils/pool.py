@@ -0,0 +1,206 @@
+""" A bounded, thread-safe pool of reusable connections. """
+
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's acquire timeout."""
+
+
+class Waiter:
+    """A caller queued for a connection, until one is handed over."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.connection = None
+        self.closed = False
+
+    def hand_over(self, connection):
+        """Pass on ``connection``, or None to let the waiter open one."""
+        self.connection = connection
+        self.event.set()
+
+    def close(self):
+        self.closed = True
+        self.event.set()
+
+
+class ConnectionPool:
+    """
+    Hands out up to ``max_size`` connections made by ``connect``, keeping
+    released ones for reuse. ``min_size`` connections are opened up front.
+
+    Once ``max_size`` connections are out, ``acquire()`` waits up to
+    ``timeout`` seconds for one to be released and then raises
+    ``PoolTimeout``. ``check(connection)`` runs on every connection handed
+    back out and ``reset(connection)`` on every one released; either returns
+    False to have the connection closed with ``close(connection)`` instead.
+    """
+
+    def __init__(
+        self,
+        connect,
+        close,
+        min_size=0,
+        max_size=10,
+        timeout=30.0,
+        check=None,
+        reset=None,
+        clock=time.monotonic,
+    ):
+        self.connect = connect
+        self.close_connection = close
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check = check
+        self.reset = reset
+        self.clock = clock
+        self.closed = False
+        self.max_waiting = 0
+        self.acquisitions = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self._idle = []
+        self._size = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            self._forget(closed=False)
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return connection
+
+    def acquire(self):
+        """Return a connection, waiting for one if the pool is exhausted."""
+        while True:
+            connection = self._take()
+            if connection is None:
+                return self._connect()
+            if self.check is None or self._safely(self.check, connection):
+                return connection
+            self._discard(connection)
+
+    def _take(self):
+        """
+        Take an idle connection, or reserve a slot for a new one and return
+        None. Once the pool is exhausted, callers queue and are served first
+        come, first served."""
+        with self._lock:
+            if self.closed:
+                raise PoolTimeout("The pool is closed")
+            self.acquisitions += 1
+            if self._idle and not self._waiters:
+                return self._idle.pop()
+            if self._size < self.max_size:
+                self._size += 1
+                return None
+            waiter = Waiter()
+            self._waiters.append(waiter)
+            self.waits += 1
+            self.max_waiting = max(self.max_waiting, len(self._waiters))
+        started = self.clock()
+        waiter.event.wait(self.timeout)
+        waited = self.clock() - started
+        with self._lock:
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if not waiter.event.is_set():
+                self._waiters.remove(waiter)
+                self.timeouts += 1
+                raise PoolTimeout(
+                    f"No connection was free within {self.timeout}s "
+                    f"({self.max_size} in use)"
+                )
+        if waiter.closed:
+            raise PoolTimeout("The pool is closed")
+        return waiter.connection
+
+    def release(self, connection):
+        """Give ``connection`` back, closing it if it cannot be reused."""
+        if self.reset is not None and not self._safely(self.reset, connection):
+            self._discard(connection)
+            return
+        with self._lock:
+            if not self.closed:
+                if self._waiters:
+                    self._waiters.popleft().hand_over(connection)
+                else:
+                    # Most recently used first, so a quiet pool reuses few
+                    # connections and the rest stay idle
+                    self._idle.append(connection)
+                return
+        self._discard(connection)
+
+    def discard(self, connection):
+        """Close ``connection`` instead of returning it to the pool."""
+        self._discard(connection)
+
+    def _discard(self, connection):
+        self._safely(self.close_connection, connection)
+        self._forget()
+
+    def _forget(self, closed=True):
+        with self._lock:
+            if closed:
+                self.connections_closed += 1
+            if self._waiters and not self.closed:
+                # The first waiter opens a connection in the freed slot
+                self._waiters.popleft().hand_over(None)
+            else:
+                self._size -= 1
+
+    def _safely(self, func, connection):
+        try:
+            return func(connection) is not False
+        except Exception:
+            return False
+
+    def close(self):
+        """
+        Close the idle connections. Connections in use are closed when they
+        are released."""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            while self._waiters:
+                self._waiters.popleft().close()
+        for connection in idle:
+            self._discard(connection)
+
+    def stats(self):
+        """Return pool size, wait-queue and timeout counters."""
+        with self._lock:
+            return {
+                "size": self._size,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": len(self._waiters),
+                "max_waiting": self.max_waiting,
+                "acquisitions": self.acquisitions,
+                "waits": self.waits,
+                "wait_seconds_total": self.wait_seconds,
+                "wait_seconds_mean": (
+                    self.wait_seconds / self.waits if self.waits else 0.0
+                ),
+                "wait_seconds_max": self.max_wait_seconds,
+                "timeouts": self.timeouts,
+                "connections_opened": self.connections_opened,
+                "connections_closed": self.connections_closed,
+            }
@@ -0,0 +1,93 @@
+""" A sampling profiler for one thread, producing collapsed stacks. """
+
+import sys
+import threading
+from collections import Counter
+
+
+def frame_name(frame):
+    """Name a frame by its module and qualified function name."""
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame, root=None):
+    """
+    Collapse the stack ending at ``frame``, outermost frame first. With
+    ``root``, the stack starts there, and is None when ``root`` is not on
+    it."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        if frame is root:
+            break
+        frame = frame.f_back
+    else:
+        if root is not None:
+            return None
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    Samples the stack of the thread that started it every ``interval``
+    seconds, from a background thread, and counts how often each collapsed
+    stack was seen. The counts are in the format flamegraph tools take, one
+    ``frame;frame;frame count`` line per stack.
+
+    Stacks start at the frame that started the sampler. Samples taken while
+    that frame is not on the stack, such as an event loop running other
+    tasks, are left out.
+
+    Sampling takes the GIL from the profiled thread, so shorter intervals
+    slow it down more.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._thread_id = None
+        self._root = None
+        self._stopped = threading.Event()
+        self._sampler = None
+
+    def start(self, root=None):
+        self._thread_id = threading.get_ident()
+        self._root = root or sys._getframe(1)
+        self._sampler = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return the stack counts."""
+        self._stopped.set()
+        self._sampler.join()
+        self._root = None
+        return self.stacks
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            # A sample taken once stopping began would show stop() waiting
+            if frame is None or self._stopped.is_set():
+                continue
+            stack = collapse(frame, self._root)
+            # Drop the reference, so the frame's locals are not kept alive
+            frame = None
+            if stack is not None:
+                self.stacks[stack] += 1
+                self.samples += 1
+
+    def __enter__(self):
+        return self.start(root=sys._getframe(1))
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def collapsed(self):
+        """The stack counts as collapsed-stack lines."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())